@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Batch RST to Markdown conversion for ActionKit documentation.
+This script converts a whole tree of RST files, mirroring the directory layout
+into an output directory and spreading the conversions across a process pool.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from docsify_index import DEFAULT_SIDEBAR_DEPTH, index_file, write_site
+from rst_assets import AssetStore
+from rst_common import atomic_write_json, find_rst_files
+from rst_rules import RuleSet, default_rules
+from rst_to_md_converter_updated import CONVERTER_VERSION, ENGINES, RSTToMarkdownConverter
+
+# Name of the incremental build manifest, kept in the output directory
+MANIFEST_NAME = '.rst2md-manifest.json'
+
+# One converter per worker process, built by the pool initializer
+_converter = None
+_options = None
+# Whether workers also index each page for the docsify sidebar and search index
+_index_pages = False
+
+
+def init_worker(engine='regex', xref_path=None, input_dir=None, time_budget=None, rules_path=None,
+                index_pages=False, assets_root=None, asset_digests=None):
+    """Build the converter once for this worker process, so its include cache lasts the whole run.
+
+    With xref_path, references are resolved through the cross-reference
+    index saved there, and each page's manifest entry records what its
+    references resolved to.
+    time_budget is passed on to the converter. Fix-up rules are loaded from
+    rules_path, or the default rules file, and their digest is an option too.
+    With index_pages, each result's manifest entry carries the page's search record.
+    With assets_root, local images are placed in that output tree by content,
+    starting from the digest cache asset_digests.
+    """
+    global _converter, _options, _index_pages
+    xref = None
+    rules = RuleSet.load(rules_path) if rules_path else default_rules()
+    _options = {'engine': engine, 'rules': rules.digest}
+    if xref_path is not None:
+        from rst_xref import XrefIndex
+        xref = XrefIndex.load(xref_path, input_dir)
+        _options['xref'] = True
+    if time_budget is not None:
+        _options['time_budget'] = time_budget
+    assets = None
+    if assets_root is not None:
+        assets = AssetStore(assets_root, asset_digests)
+        _options['assets'] = True
+    _converter = RSTToMarkdownConverter(engine=engine, xref=xref, time_budget=time_budget, rules=rules,
+                                       assets=assets)
+    _index_pages = index_pages
+
+
+def worker_converter():
+    """Return the converter built by init_worker() for this process."""
+    return _converter
+
+
+def file_hash(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    """Load the incremental build manifest, or return an empty one."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    """Atomically write the incremental build manifest."""
+    atomic_write_json(os.path.join(output_dir, MANIFEST_NAME), manifest, indent=1, sort_keys=True)
+
+
+def _is_current(entry, rst_file, md_file, stat):
+    """Check a manifest entry against the source, converter version and options.
+
+    Returns the source hash when the entry is current, otherwise None. The
+    size and mtime are compared first so unchanged files are not read at all.
+    Files pulled in by include directives are checked by mtime. With an
+    xref index, the entry is stale if any of the page's references now
+    resolves differently.
+    """
+    if (not entry or entry.get('converter_version') != CONVERTER_VERSION
+            or entry.get('options') != _options or not os.path.exists(md_file)):
+        return None
+    # A change to any included file makes the output stale too
+    for path, mtime in entry.get('includes', {}).items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime:
+                return None
+        except OSError:
+            return None
+    xref = _converter.xref
+    if xref is not None and xref.references_changed(entry.get('references', {}), rst_file):
+        return None
+    if entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns:
+        return entry['source_hash']
+    source_hash = file_hash(rst_file)
+    return source_hash if source_hash == entry.get('source_hash') else None
+
+
+def convert_one(job):
+    """Convert a single file and return its result record."""
+    rst_file, md_file, entry, force = job
+    start = time.perf_counter()
+    result = {
+        'source': rst_file,
+        'output': md_file,
+        'status': 'converted',
+        'error': None,
+        'fallback': False,
+        'rule_hits': {},
+        'assets': {},
+        'asset_digests': {},
+        'seconds': 0.0,
+        'manifest_entry': None
+    }
+    try:
+        stat = os.stat(rst_file)
+        source_hash = None if force else _is_current(entry, rst_file, md_file, stat)
+        if source_hash is not None:
+            result['status'] = 'skipped'
+            included = entry.get('includes', {})
+            references = entry.get('references')
+        else:
+            os.makedirs(os.path.dirname(md_file) or '.', exist_ok=True)
+            source_hash = file_hash(rst_file)
+            included = {}
+            fallbacks = len(_converter.fallbacks)
+            hits = Counter(_converter.rules.hits)
+            placed = Counter(_converter.assets.stats) if _converter.assets is not None else None
+            _converter.convert_file(rst_file, md_file, included=included)
+            result['fallback'] = len(_converter.fallbacks) > fallbacks
+            result['rule_hits'] = dict(Counter(_converter.rules.hits) - hits)
+            if _converter.assets is not None:
+                result['assets'] = dict(Counter(_converter.assets.stats) - placed)
+                result['asset_digests'] = _converter.assets.take_updates()
+            references = _page_references(rst_file, included) if _converter.xref is not None else None
+        result['manifest_entry'] = {
+            'source_hash': source_hash,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'converter_version': CONVERTER_VERSION,
+            'options': _options,
+            'includes': included
+        }
+        if references is not None:
+            result['manifest_entry']['references'] = references
+        if _index_pages:
+            # Unchanged pages reuse their record, so skipped files are not read
+            search = entry.get('search') if result['status'] == 'skipped' else None
+            result['manifest_entry']['search'] = search or index_file(md_file)
+    except Exception as e:
+        # Record the failure and keep going with the rest of the batch
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def _page_references(rst_file, included):
+    """Return what the references in a page and the files it includes resolve to.
+
+    Included files are converted in the context of the page, so their
+    references are resolved relative to it. Placed images are skipped.
+    """
+    placed = _converter.assets.digests if _converter.assets is not None else {}
+    references = {}
+    for path in [rst_file] + sorted(included):
+        if path in placed:
+            continue
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        for key, value in _converter.xref.references(text, rst_file).items():
+            references.setdefault(key, value)
+    return references
+
+
+def output_path_for(rst_file, input_dir, output_dir):
+    """Mirror an input file path into the output tree with a .md extension."""
+    relative = os.path.relpath(rst_file, input_dir)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + '.md')
+
+
+def site_pages(output_dir, entries):
+    """Return the search records of (md_file, manifest entry) pairs, keyed by path in output_dir."""
+    pages = {}
+    for md_file, entry in entries:
+        if entry is not None and 'search' in entry:
+            pages[os.path.relpath(md_file, output_dir).replace(os.sep, '/')] = entry['search']
+    return pages
+
+
+def convert_directory(input_dir, output_dir, workers=None, engine='regex', incremental=False,
+                      force=False, xref=False, time_budget=None, rules_path=None, site=False,
+                      sidebar_depth=DEFAULT_SIDEBAR_DEPTH, assets=False):
+    """Convert every RST file under input_dir into output_dir.
+
+    Returns a dict with a 'summary' of the run and a per-file 'files' list.
+    Failures are collected rather than raised. With incremental=True, files
+    whose manifest entry still matches are skipped unless force is set.
+    With xref=True the cross-reference index in output_dir is brought up to
+    date first and internal references are rewritten to the .md files.
+    With time_budget, a file that takes the regex engine longer than that
+    many seconds is converted with the lexer engine and listed in the
+    summary's 'fallbacks'. rules_path selects the fix-up rules file; the
+    summary's 'rule_hits' counts how often each rule fired in this run.
+    With site=True, a docsify _sidebar.md and search index covering every
+    page are written to output_dir, from records taken as each page is written.
+    With assets=True, local images are placed once each under _images/ in
+    output_dir, named by content, and the pages link to them there.
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    manifest = load_manifest(output_dir) if incremental else {}
+
+    xref_path = None
+    if xref:
+        from rst_xref import INDEX_NAME, XrefIndex
+        xref_path = os.path.join(output_dir, INDEX_NAME)
+        index = XrefIndex.load(xref_path, input_dir)
+        index.update()
+        index.save(xref_path)
+
+    store = AssetStore.load(output_dir) if assets else None
+    assets_root = output_dir if assets else None
+    asset_digests = store.digests if assets else None
+
+    jobs = []
+    for rst_file in find_rst_files(input_dir):
+        md_file = output_path_for(rst_file, input_dir, output_dir)
+        key = os.path.relpath(md_file, output_dir)
+        jobs.append((rst_file, md_file, manifest.get(key), force))
+
+    if workers == 1 or len(jobs) <= 1:
+        # Not worth starting a pool for a single worker or file
+        init_worker(engine, xref_path, input_dir, time_budget, rules_path, site, assets_root, asset_digests)
+        results = [convert_one(job) for job in jobs]
+    else:
+        # Hand out work in chunks so per-task overhead stays small
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(engine, xref_path, input_dir, time_budget, rules_path, site,
+                                           assets_root, asset_digests)) as executor:
+            results = list(executor.map(convert_one, jobs, chunksize=chunksize))
+
+    if incremental:
+        # Only files present in this run are kept, so deleted sources drop out
+        manifest = {}
+        for r in results:
+            if r['manifest_entry'] is not None:
+                manifest[os.path.relpath(r['output'], output_dir)] = r['manifest_entry']
+        save_manifest(output_dir, manifest)
+
+    asset_stats = Counter()
+    if store is not None:
+        for r in results:
+            store.merge(r['asset_digests'])
+            asset_stats.update(r['assets'])
+        store.save()
+
+    if site:
+        pages = site_pages(output_dir, [(r['output'], r['manifest_entry']) for r in results])
+        write_site(output_dir, pages, sidebar_depth)
+
+    # Every rule is listed, so ones that never fire stand out
+    rules = RuleSet.load(rules_path) if rules_path else default_rules()
+    rule_hits = {rule.name: 0 for rule in rules.rules}
+    for r in results:
+        for name, count in r['rule_hits'].items():
+            rule_hits[name] += count
+
+    failed = [r for r in results if r['status'] == 'failed']
+    skipped = [r for r in results if r['status'] == 'skipped']
+    summary = {
+        'input_dir': input_dir,
+        'output_dir': output_dir,
+        'workers': workers,
+        'engine': engine,
+        'total': len(results),
+        'converted': len(results) - len(failed) - len(skipped),
+        'skipped': len(skipped),
+        'failed': len(failed),
+        'fallbacks': [r['source'] for r in results if r['fallback']],
+        'rule_hits': rule_hits,
+        'assets': dict(asset_stats),
+        'errors': [{'source': r['source'], 'error': r['error']} for r in failed],
+        'wall_seconds': time.perf_counter() - start
+    }
+
+    return {'summary': summary, 'files': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert a tree of RST files to Markdown.')
+    parser.add_argument('input_dir', help='Directory containing the RST sources')
+    parser.add_argument('output_dir', help='Directory to write the Markdown tree to')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Number of worker processes (default: all cores)')
+    parser.add_argument('--engine', choices=ENGINES, default='regex',
+                        help='Conversion engine to use (default: regex)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip files whose source, converter version and options are unchanged')
+    parser.add_argument('--force', action='store_true',
+                        help='Reconvert every file even if the manifest says it is up to date')
+    parser.add_argument('--report', help='Write the full per-file report as JSON to this path')
+    parser.add_argument('--xref', action='store_true',
+                        help='Index targets across the tree and rewrite :ref:, :doc: and `label`_ references')
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS',
+                        help='Convert a file with the lexer engine if the regex engine takes longer than this')
+    parser.add_argument('--rules', metavar='FILE',
+                        help='JSON or YAML file of fix-up rules (default: fixup_rules.json)')
+    parser.add_argument('--site', action='store_true',
+                        help='Also write a docsify _sidebar.md and search-index.json to the output directory')
+    parser.add_argument('--sidebar-depth', type=int, default=DEFAULT_SIDEBAR_DEPTH,
+                        help=f"Deepest heading level listed in the sidebar (default: {DEFAULT_SIDEBAR_DEPTH})")
+    parser.add_argument('--assets', action='store_true',
+                        help='Place local images once each under _images/ in the output, named by content')
+    parser.add_argument('--watch', action='store_true',
+                        help='After converting, keep watching the input tree and reconvert changed files')
+    parser.add_argument('--poll', action='store_true',
+                        help='Watch by polling instead of inotify')
+    parser.add_argument('--debounce-ms', type=float, default=50,
+                        help='Quiet period that ends a burst of saves in watch mode (default: 50)')
+    args = parser.parse_args(argv)
+
+    report = convert_directory(args.input_dir, args.output_dir, workers=args.workers,
+                               engine=args.engine, incremental=args.incremental or args.watch,
+                               force=args.force, xref=args.xref, time_budget=args.time_budget,
+                               rules_path=args.rules, site=args.site, sidebar_depth=args.sidebar_depth,
+                               assets=args.assets)
+    summary = report['summary']
+
+    for error in summary['errors']:
+        print(f"Error converting {error['source']}: {error['error']}", file=sys.stderr)
+    if summary['fallbacks']:
+        print(f"{len(summary['fallbacks'])} files ran out of time and were converted with the lexer engine",
+              file=sys.stderr)
+
+    unused = [name for name, count in summary['rule_hits'].items() if not count]
+    # Only the regex engine applies the fix-up rules
+    if unused and summary['converted'] and summary['engine'] == 'regex':
+        print(f"Fix-up rules that never fired: {', '.join(unused)}")
+
+    if summary['assets']:
+        print("Images: " + ', '.join(f"{count} {kind}" for kind, count in sorted(summary['assets'].items())))
+
+    print(f"Converted {summary['converted']}/{summary['total']} files "
+          f"({summary['skipped']} unchanged) with {summary['workers']} workers in {summary['wall_seconds']:.2f}s")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.watch:
+        from watch_convert import watch_directory
+        watch_directory(args.input_dir, args.output_dir, engine=args.engine,
+                        debounce=args.debounce_ms / 1000, polling=args.poll, xref=args.xref,
+                        time_budget=args.time_budget, rules_path=args.rules, site=args.site,
+                        sidebar_depth=args.sidebar_depth, assets=args.assets)
+        return 0
+
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Warm conversion server for editor and pre-commit hooks.
+`serve` keeps converters loaded and answers convert and analyze requests over
+a Unix domain socket. The `convert` and `analyze` commands send a request to
+the server and fall back to converting in-process when no server is running.
+
+Requests and responses are single lines of JSON.
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+
+from rst_to_md_converter_updated import ENGINES, RSTToMarkdownConverter
+
+# Seconds a client waits for the server before giving up
+CLIENT_TIMEOUT = 30
+
+
+def default_socket_path():
+    """Return the per-user socket path used when none is given."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"rst2md-{os.getuid()}.sock")
+
+
+def handle_request(request, converters):
+    """Run one request and return the response dict.
+
+    converters is a dict of engine name to converter. Engines missing from
+    it are added as they are used, so a dict shared between threads should
+    already hold every engine (see ConversionServer).
+    """
+    op = request.get('op')
+    if op == 'ping':
+        return {'ok': True}
+
+    if op == 'convert':
+        engine = request.get('engine', 'regex')
+        if engine not in converters:
+            converters[engine] = RSTToMarkdownConverter(engine=engine)
+        converter = converters[engine]
+        if 'content' in request:
+            return {'ok': True, 'markdown': converter.convert_content(request['content'])}
+        md_file = converter.convert_file(request['path'], request.get('output'))
+        return {'ok': True, 'output': md_file}
+
+    if op == 'analyze':
+        from rst_analyzer import SimpleRSTAnalyzer
+        analyzer = SimpleRSTAnalyzer(depth=request.get('depth', 'full'))
+        if 'content' in request:
+            analyzer.analyze_content(request['content'])
+        else:
+            with open(request['path'], 'r', encoding='utf-8') as f:
+                analyzer.analyze_content(f.read())
+        return {'ok': True, 'report': analyzer.generate_report()}
+
+    return {'ok': False, 'error': f"Unknown op {op!r}"}
+
+
+class ConversionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that keeps one warm converter per engine."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        # Built up front, so handler threads only ever read the dict
+        self.converters = {engine: RSTToMarkdownConverter(engine=engine) for engine in ENGINES}
+        self.socket_path = socket_path
+        super().__init__(socket_path, ConversionHandler)
+
+
+class ConversionHandler(socketserver.StreamRequestHandler):
+    """Handle newline-delimited JSON requests on one connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get('op') == 'shutdown':
+                    response = {'ok': True}
+                    # shutdown() blocks until serve_forever returns, so call it from another thread
+                    threading.Thread(target=self.server.shutdown).start()
+                else:
+                    response = handle_request(request, self.server.converters)
+            except Exception as e:
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+def serve(socket_path):
+    """Serve requests on socket_path until a shutdown request arrives."""
+    if os.path.exists(socket_path):
+        # Refuse to take over a socket that another server is still answering
+        try:
+            send_request({'op': 'ping'}, socket_path, timeout=1)
+            raise RuntimeError(f"A server is already listening on {socket_path}")
+        except OSError:
+            os.unlink(socket_path)
+
+    server = ConversionServer(socket_path)
+    os.chmod(socket_path, 0o600)
+    print(f"Serving on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def send_request(request, socket_path, timeout=CLIENT_TIMEOUT):
+    """Send one request to the server and return its response.
+
+    Raises FileNotFoundError or ConnectionRefusedError when no server is
+    listening, and TimeoutError when it doesn't answer within timeout seconds.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError('Server closed the connection without responding')
+    return json.loads(line)
+
+
+def request_or_fallback(request, socket_path):
+    """Send a request to the server, or run it in this process if none is running.
+
+    Returns (response, where) with where set to 'server' or 'in-process'.
+    Only a missing socket or a refused connection falls back: after a
+    timeout the server may still be working on the request, and running it
+    again here could write the same output file at the same time.
+    """
+    try:
+        return send_request(request, socket_path), 'server'
+    except (FileNotFoundError, ConnectionRefusedError):
+        return handle_request(request, {}), 'in-process'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Warm RST to Markdown conversion server and client.')
+    parser.add_argument('--socket', default=None, help='Socket path (default: per-user runtime directory)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('serve', help='Run the server in the foreground')
+    commands.add_parser('stop', help='Ask a running server to exit')
+
+    convert = commands.add_parser('convert', help='Convert an RST file, using the server if it is running')
+    convert.add_argument('rst_file')
+    convert.add_argument('-o', '--output', help='Markdown file to write (default: alongside the input)')
+    convert.add_argument('--engine', choices=ENGINES, default='regex')
+
+    analyze = commands.add_parser('analyze', help='Analyze an RST file, using the server if it is running')
+    analyze.add_argument('rst_file')
+    analyze.add_argument('--depth', choices=('fast', 'full'), default='full')
+
+    args = parser.parse_args(argv)
+    socket_path = args.socket or default_socket_path()
+
+    if args.command == 'serve':
+        serve(socket_path)
+        return 0
+
+    if args.command == 'stop':
+        try:
+            send_request({'op': 'shutdown'}, socket_path)
+        except OSError:
+            print(f"No server listening on {socket_path}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.command == 'convert':
+        # Paths are made absolute because the server may run in another directory
+        request = {'op': 'convert', 'path': os.path.abspath(args.rst_file), 'engine': args.engine,
+                   'output': os.path.abspath(args.output) if args.output else None}
+    else:
+        request = {'op': 'analyze', 'path': os.path.abspath(args.rst_file), 'depth': args.depth}
+
+    try:
+        response, where = request_or_fallback(request, socket_path)
+    except Exception as e:
+        response, where = {'ok': False, 'error': f"{type(e).__name__}: {e}"}, 'in-process'
+
+    if not response.get('ok'):
+        print(f"Error processing {args.rst_file}: {response.get('error')}", file=sys.stderr)
+        return 1
+
+    if args.command == 'convert':
+        print(f"Converted {args.rst_file} to {response['output']} ({where})")
+    else:
+        print(json.dumps(response['report'], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+/*
+ * Search for docsify sites written by batch_convert.py --site (or docsify_index.py).
+ * Loads the prebuilt search-index.json once, instead of fetching and indexing
+ * every page in the browser as docsify's own search plugin does. Include it
+ * after docsify, in place of search.min.js:
+ *
+ *   <script src="//cdn.jsdelivr.net/npm/docsify@4"></script>
+ *   <script src="docsify-search.js"></script>
+ *
+ * Options, all optional, go in window.$docsify.prebuiltSearch:
+ *   index        path of the index (default 'search-index.json')
+ *   placeholder  text of the empty search box (default 'Search')
+ *   limit        most results shown (default 20)
+ */
+(function () {
+  'use strict';
+
+  // Layout of search-index.json this plugin reads; SEARCH_INDEX_VERSION in docsify_index.py
+  var INDEX_VERSION = 1;
+
+  // Same words as docsify_index.tokenize: runs of two or more letters or digits, lowercased
+  function words(text) {
+    return text.toLowerCase().match(/[\p{L}\p{N}]{2,}/gu) || [];
+  }
+
+  function escapeHtml(text) {
+    return String(text).replace(/[&<>"']/g, function (c) {
+      return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+    });
+  }
+
+  function route(path, anchor) {
+    var page = '#/' + path.replace(/\.md$/, '').replace(/(^|\/)README$/, '$1');
+    return anchor ? page + '?id=' + encodeURIComponent(anchor) : page;
+  }
+
+  // Turn the index into one record per section, with its words split once
+  function load(data) {
+    if (data.version !== INDEX_VERSION) {
+      throw new Error('search index version ' + data.version + ', expected ' + INDEX_VERSION);
+    }
+    return data.sections.map(function (section) {
+      var page = data.pages[section[0]];
+      var title = section[2] || page[1] || page[0];
+      return {
+        path: page[0],
+        page: page[1] || page[0],
+        title: title,
+        anchor: section[3],
+        titleWords: words(title),
+        words: section[4] ? section[4].split(' ') : []
+      };
+    });
+  }
+
+  function hasPrefix(list, word) {
+    for (var i = 0; i < list.length; i++) {
+      if (list[i].lastIndexOf(word, 0) === 0) {
+        return true;
+      }
+    }
+    return false;
+  }
+
+  // Sections where every query word starts a word of the section, title matches first
+  function search(sections, query, limit) {
+    var terms = words(query);
+    if (!terms.length) {
+      return [];
+    }
+    var results = [];
+    sections.forEach(function (section) {
+      var score = 0;
+      for (var i = 0; i < terms.length; i++) {
+        if (hasPrefix(section.titleWords, terms[i])) {
+          score += 2;
+        } else if (hasPrefix(section.words, terms[i])) {
+          score += 1;
+        } else {
+          return;
+        }
+      }
+      results.push({section: section, score: score});
+    });
+    results.sort(function (a, b) { return b.score - a.score; });
+    return results.slice(0, limit).map(function (result) { return result.section; });
+  }
+
+  function render(results) {
+    return results.map(function (section) {
+      var label = section.title === section.page
+        ? escapeHtml(section.page)
+        : escapeHtml(section.page) + ' &rsaquo; ' + escapeHtml(section.title);
+      return '<li><a href="' + escapeHtml(route(section.path, section.anchor)) + '">' + label + '</a></li>';
+    }).join('');
+  }
+
+  function plugin(hook, vm) {
+    var options = (vm.config && vm.config.prebuiltSearch) || {};
+    var sections = null;
+    var pending = null;
+
+    function index() {
+      if (!pending) {
+        pending = fetch(options.index || 'search-index.json')
+          .then(function (response) {
+            if (!response.ok) {
+              throw new Error('HTTP ' + response.status);
+            }
+            return response.json();
+          })
+          .then(function (data) { sections = load(data); })
+          .catch(function (error) {
+            pending = null;
+            console.error('docsify-search: could not load the search index: ' + error.message);
+          });
+      }
+      return pending;
+    }
+
+    hook.mounted(function () {
+      var sidebar = document.querySelector('.sidebar');
+      if (!sidebar) {
+        return;
+      }
+      var box = document.createElement('div');
+      box.className = 'prebuilt-search';
+      box.innerHTML = '<input type="search" placeholder="' + escapeHtml(options.placeholder || 'Search') + '">'
+        + '<ul class="results"></ul>';
+      sidebar.insertBefore(box, sidebar.firstChild);
+      var input = box.querySelector('input');
+      var list = box.querySelector('.results');
+
+      input.addEventListener('focus', index);
+      input.addEventListener('input', function () {
+        var query = input.value;
+        index().then(function () {
+          if (sections && input.value === query) {
+            list.innerHTML = render(search(sections, query, options.limit || 20));
+          }
+        });
+      });
+      // Following a result clears the search
+      list.addEventListener('click', function (event) {
+        if (event.target.closest('a')) {
+          input.value = '';
+          list.innerHTML = '';
+        }
+      });
+    });
+  }
+
+  window.$docsify = window.$docsify || {};
+  window.$docsify.plugins = [plugin].concat(window.$docsify.plugins || []);
+})();
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Prebuilt docsify sidebar and search index for converted Markdown.
+Each page is read in one pass that records its headings, their docsify
+anchors and the words under each one. The records of all pages become a
+_sidebar.md and a compact search index. docsify-search.js, written next to
+them, is a docsify plugin that searches that index, so readers load one
+small file instead of docsify crawling and indexing every page in the browser.
+"""
+
+import argparse
+import json
+import os
+import posixpath
+import re
+import sys
+from collections import Counter
+
+from rst_common import FenceTracker, atomic_write, find_md_files, quote_prefix_pattern
+from rst_to_md_converter_updated import slugify
+
+# Bump when the layout of the search index changes, along with INDEX_VERSION in docsify-search.js
+SEARCH_INDEX_VERSION = 1
+
+SIDEBAR_NAME = '_sidebar.md'
+SEARCH_INDEX_NAME = 'search-index.json'
+SEARCH_PLUGIN_NAME = 'docsify-search.js'
+
+# The plugin that reads the search index in the browser, shipped next to this module
+SEARCH_PLUGIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), SEARCH_PLUGIN_NAME)
+
+# Deepest heading level listed under each page in the sidebar
+DEFAULT_SIDEBAR_DEPTH = 2
+
+heading_pattern = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+link_pattern = re.compile(r'!?\[([^\]]*)\]\([^)]*\)')
+tag_pattern = re.compile(r'<[^>]+>')
+word_pattern = re.compile(r'[^\W_]{2,}')
+
+
+def tokenize(text):
+    """Return the lowercased words of a line of Markdown, without link targets or HTML tags."""
+    text = tag_pattern.sub(' ', link_pattern.sub(r'\1', text))
+    return word_pattern.findall(text.lower())
+
+
+def index_markdown(text):
+    """Return the search record of one page: its title and a list of sections.
+
+    Each section is [level, title, anchor, tokens], where tokens is a space
+    separated string of the distinct words under the heading, in the order
+    they first appear. Words before the first heading form a section of
+    level 0 with no anchor. Anchors are numbered -1, -2 and so on when a
+    heading repeats, as docsify numbers them; headings inside blockquotes
+    count for that but don't start sections.
+    """
+    title = None
+    sections = []
+    seen = Counter()
+    level, heading, anchor = 0, None, None
+    words = {}
+    fence = FenceTracker()
+
+    def close():
+        if heading is not None or words:
+            sections.append([level, heading, anchor, ' '.join(words)])
+
+    for line in text.split('\n'):
+        quoted = quote_prefix_pattern.match(line).end()
+        body = line[quoted:]
+
+        was_open = fence.open
+        if fence.feed(body):
+            if was_open and fence.open:
+                words.update(dict.fromkeys(tokenize(body)))
+            continue
+
+        match = heading_pattern.match(body)
+        if match:
+            slug = slugify(match.group(2))
+            heading_anchor = f"{slug}-{seen[slug]}" if seen[slug] else slug
+            seen[slug] += 1
+            if not quoted:
+                close()
+                level, heading, anchor = len(match.group(1)), tag_pattern.sub('', match.group(2)), heading_anchor
+                words = {}
+                if title is None:
+                    title = heading
+                continue
+
+        words.update(dict.fromkeys(tokenize(body)))
+
+    close()
+    return {'title': title, 'sections': sections}
+
+
+def index_file(md_file):
+    """Read and index one Markdown file."""
+    with open(md_file, 'r', encoding='utf-8') as f:
+        return index_markdown(f.read())
+
+
+def _route(path, anchor=None):
+    """Return the docsify link for a page, and a section of it."""
+    return f"{path}?id={anchor}" if anchor else path
+
+
+def build_sidebar(pages, depth=DEFAULT_SIDEBAR_DEPTH):
+    """Return the Markdown of a docsify sidebar for pages, a dict of path to record.
+
+    Pages are grouped by directory. Each page is linked by its title and
+    its headings down to depth are nested under it, apart from the title
+    heading itself.
+    """
+    lines = []
+    directories = []
+    for path in sorted(pages, key=lambda p: (posixpath.dirname(p).split('/'), p)):
+        record = pages[path]
+        parts = posixpath.dirname(path).split('/') if posixpath.dirname(path) else []
+        # Open list items for directories not already open
+        common = 0
+        while common < min(len(parts), len(directories)) and parts[common] == directories[common]:
+            common += 1
+        for i in range(common, len(parts)):
+            lines.append(f"{'  ' * i}- {parts[i]}")
+        directories = parts
+
+        indent = '  ' * len(parts)
+        title = record['title'] or posixpath.splitext(posixpath.basename(path))[0]
+        lines.append(f"{indent}- [{title}]({_route(path)})")
+        first = True
+        for level, heading, anchor, _ in record['sections']:
+            if heading is None:
+                continue
+            if first and heading == record['title']:
+                first = False
+                continue
+            first = False
+            if level <= depth:
+                lines.append(f"{indent}  - [{heading}]({_route(path, anchor)})")
+    return '\n'.join(lines) + '\n'
+
+
+def build_search_index(pages):
+    """Return the search index for pages, a dict of path to record.
+
+    Pages are listed once and each section refers to its page by position,
+    so the index is a single small JSON document:
+    {"version": 1, "pages": [[path, title], ...],
+     "sections": [[page, level, title, anchor, tokens], ...]}
+    """
+    paths = sorted(pages)
+    sections = []
+    for number, path in enumerate(paths):
+        for level, heading, anchor, tokens in pages[path]['sections']:
+            sections.append([number, level, heading, anchor, tokens])
+    return {
+        'version': SEARCH_INDEX_VERSION,
+        'pages': [[path, pages[path]['title']] for path in paths],
+        'sections': sections
+    }
+
+
+def write_site(output_dir, pages, depth=DEFAULT_SIDEBAR_DEPTH):
+    """Atomically write _sidebar.md, the search index and the search plugin into output_dir."""
+    atomic_write(os.path.join(output_dir, SIDEBAR_NAME), build_sidebar(pages, depth))
+    atomic_write(os.path.join(output_dir, SEARCH_INDEX_NAME),
+                 json.dumps(build_search_index(pages), separators=(',', ':'), ensure_ascii=False))
+    with open(SEARCH_PLUGIN_PATH, 'r', encoding='utf-8') as f:
+        plugin = f.read()
+    target = os.path.join(output_dir, SEARCH_PLUGIN_NAME)
+    # Rewritten only when it changes, as it rarely does
+    try:
+        with open(target, 'r', encoding='utf-8') as f:
+            current = f.read()
+    except OSError:
+        current = None
+    if current != plugin:
+        atomic_write(target, plugin)
+
+
+def index_tree(output_dir):
+    """Index every converted page under output_dir, keyed by POSIX path relative to it."""
+    pages = {}
+    for path in find_md_files(output_dir):
+        if not os.path.basename(path).startswith('_'):
+            pages[os.path.relpath(path, output_dir).replace(os.sep, '/')] = index_file(path)
+    return pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a docsify sidebar and search index for a Markdown tree.')
+    parser.add_argument('output_dir', help='Directory of converted Markdown')
+    parser.add_argument('--sidebar-depth', type=int, default=DEFAULT_SIDEBAR_DEPTH,
+                        help=f"Deepest heading level listed in the sidebar (default: {DEFAULT_SIDEBAR_DEPTH})")
+    args = parser.parse_args(argv)
+
+    pages = index_tree(args.output_dir)
+    write_site(args.output_dir, pages, args.sidebar_depth)
+    sections = sum(len(record['sections']) for record in pages.values())
+    print(f"Indexed {len(pages)} pages and {sections} sections into {SIDEBAR_NAME} and {SEARCH_INDEX_NAME}, "
+          f"searched by {SEARCH_PLUGIN_NAME}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Validator for converted Markdown.
+Each file is checked in one pass over its lines for unclosed code fences,
+links and images whose local targets don't exist, anchors missing from the
+same page, and malformed pipe tables. Local targets are looked up in a
+listing of the output tree taken once per run. Files are checked in
+parallel and the results can be written as a JSON report for CI.
+"""
+
+import argparse
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from rst_common import FenceTracker, find_md_files, quote_prefix_pattern
+from rst_to_md_converter_updated import slugify
+
+# Kinds of problem the validator reports
+CHECKS = ('unclosed_fence', 'broken_link', 'missing_image', 'missing_anchor', 'malformed_table')
+
+heading_pattern = re.compile(r'^#{1,6}\s+(.*?)\s*#*\s*$')
+code_span_pattern = re.compile(r'`+[^`]*`+')
+link_pattern = re.compile(r'(!?)\[[^\]]*\]\(\s*<?([^)\s>]*)>?(?:\s+"[^"]*")?\s*\)')
+html_target_pattern = re.compile(r'<(img|a)\s[^>]*?\b(src|href)="([^"]*)"', re.IGNORECASE)
+table_delimiter_pattern = re.compile(r'^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+external_pattern = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*:|//)')
+
+# Listing of the output tree, its root and the options, set once per worker process
+_listing = None
+_root = None
+_check_absolute = False
+
+
+def list_tree(root):
+    """Return the set of files and directories under root, as POSIX paths relative to it."""
+    listing = set()
+    for dirpath, dirs, files in os.walk(root):
+        relative = os.path.relpath(dirpath, root).replace(os.sep, '/')
+        prefix = '' if relative == '.' else relative + '/'
+        listing.update(prefix + name for name in dirs)
+        listing.update(prefix + name for name in files)
+    return listing
+
+
+def _init_worker(root, listing, check_absolute=False):
+    """Keep the tree listing and options for this worker process."""
+    global _listing, _root, _check_absolute
+    _root = root
+    _listing = listing
+    _check_absolute = check_absolute
+
+
+def _count_cells(row):
+    """Count the cells of a pipe table row, ignoring escaped pipes."""
+    row = row.strip().replace('\\|', '')
+    if row.startswith('|'):
+        row = row[1:]
+    if row.endswith('|'):
+        row = row[:-1]
+    return row.count('|') + 1
+
+
+def validate_markdown(text, relative_path='', listing=None, check_absolute=False):
+    """Return the problems found in one Markdown document.
+
+    relative_path is the document's POSIX path within the output tree and
+    listing the set returned by list_tree; without a listing, local link
+    and image targets are not checked. Targets starting with / usually
+    point into the ActionKit site rather than the docs, so they are only
+    checked (against the tree root) with check_absolute. Each problem is a
+    dict with the line number, the check that failed and a message.
+    """
+    issues = []
+    base = posixpath.dirname(relative_path)
+    anchors = set()
+    headings = Counter()
+    anchor_refs = []
+    fence = FenceTracker()
+    table = None
+
+    def report(line, check, message):
+        issues.append({'line': line, 'check': check, 'message': message})
+
+    def check_target(number, target, image):
+        if not target:
+            report(number, 'missing_image' if image else 'broken_link', 'Empty target')
+            return
+        if external_pattern.match(target):
+            return
+        path, _, anchor = target.partition('#')
+        path = path.split('?', 1)[0]
+        if not path:
+            if anchor:
+                anchor_refs.append((number, anchor))
+            return
+        if listing is None or (path.startswith('/') and not check_absolute):
+            return
+        resolved = posixpath.normpath(path.lstrip('/') if path.startswith('/') else posixpath.join(base, path))
+        if resolved not in listing and resolved.rstrip('/') not in listing:
+            check = 'missing_image' if image else 'broken_link'
+            report(number, check, f"{'Image' if image else 'Link'} target not found: {target}")
+
+    def end_table():
+        if table is not None and not table['delimited']:
+            report(table['start'], 'malformed_table', 'Table has no delimiter row under its header')
+
+    for number, raw in enumerate(text.split('\n'), 1):
+        line = quote_prefix_pattern.sub('', raw)
+        stripped = line.strip()
+
+        # Code fences: nothing inside them is checked
+        was_open = fence.open
+        if fence.feed(stripped, number):
+            if not was_open:
+                end_table()
+                table = None
+            continue
+
+        # Pipe tables: a header row, a delimiter row, then rows of the same width
+        if stripped.startswith('|'):
+            cells = _count_cells(stripped)
+            if table is None:
+                table = {'start': number, 'cells': cells, 'delimited': False}
+            elif not table['delimited'] and number == table['start'] + 1:
+                if table_delimiter_pattern.match(stripped):
+                    table['delimited'] = True
+                if cells != table['cells']:
+                    report(number, 'malformed_table', f"Delimiter row has {cells} cells, header has {table['cells']}")
+            elif table['delimited'] and cells != table['cells']:
+                report(number, 'malformed_table', f"Row has {cells} cells, header has {table['cells']}")
+        else:
+            end_table()
+            table = None
+
+        heading = heading_pattern.match(line)
+        if heading:
+            # Repeated headings get -1, -2 and so on, as docsify numbers them
+            slug = slugify(heading.group(1))
+            anchors.add(f"{slug}-{headings[slug]}" if headings[slug] else slug)
+            headings[slug] += 1
+
+        plain = code_span_pattern.sub('', line)
+        if '](' in plain:
+            for link in link_pattern.finditer(plain):
+                check_target(number, link.group(2), link.group(1) == '!')
+        if '<' in plain:
+            for tag in html_target_pattern.finditer(plain):
+                check_target(number, tag.group(3), tag.group(1).lower() == 'img')
+
+    end_table()
+    if fence.open:
+        report(fence.line, 'unclosed_fence', f"Code fence {fence.fence} is never closed")
+    for number, anchor in anchor_refs:
+        if anchor not in anchors:
+            report(number, 'missing_anchor', f"No heading with anchor #{anchor} on this page")
+    issues.sort(key=lambda issue: issue['line'])
+    return issues
+
+
+def _validate_one(md_file):
+    """Validate a single file and return its result record."""
+    result = {'path': md_file, 'issues': [], 'error': None}
+    try:
+        with open(md_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+        relative = os.path.relpath(md_file, _root).replace(os.sep, '/')
+        result['issues'] = validate_markdown(text, relative, _listing, _check_absolute)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def validate_tree(path, workers=None, check_absolute=False):
+    """Validate a Markdown file or every Markdown file under a directory.
+
+    Returns a dict with a 'summary' of the run and a per-file 'files' list.
+    The tree is listed once and shared with every worker.
+    """
+    start = time.perf_counter()
+    root = path if os.path.isdir(path) else os.path.dirname(path) or '.'
+    md_files = find_md_files(path) if os.path.isdir(path) else [path]
+    listing = list_tree(root)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(md_files) <= 1:
+        _init_worker(root, listing, check_absolute)
+        results = [_validate_one(md_file) for md_file in md_files]
+    else:
+        chunksize = max(1, len(md_files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(root, listing, check_absolute)) as executor:
+            results = list(executor.map(_validate_one, md_files, chunksize=chunksize))
+
+    by_check = Counter(issue['check'] for r in results for issue in r['issues'])
+    summary = {
+        'root': root,
+        'files': len(results),
+        'files_with_issues': sum(1 for r in results if r['issues'] or r['error']),
+        'issues': sum(by_check.values()),
+        'by_check': {check: by_check[check] for check in CHECKS},
+        'errors': [{'path': r['path'], 'error': r['error']} for r in results if r['error']],
+        'wall_seconds': time.perf_counter() - start
+    }
+    return {'summary': summary, 'files': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate converted Markdown files.')
+    parser.add_argument('path', help='Markdown file or directory of Markdown files')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Number of worker processes (default: all cores)')
+    parser.add_argument('--check-absolute', action='store_true',
+                        help='Also check targets starting with /, relative to the tree root')
+    parser.add_argument('--report', help='Write the full report as JSON to this path')
+    args = parser.parse_args(argv)
+
+    report = validate_tree(args.path, args.workers, args.check_absolute)
+    summary = report['summary']
+
+    for r in report['files']:
+        if r['error']:
+            print(f"{r['path']}: {r['error']}", file=sys.stderr)
+        for issue in r['issues']:
+            print(f"{r['path']}:{issue['line']}: {issue['check']}: {issue['message']}")
+
+    print(f"Checked {summary['files']} files: {summary['issues']} issues in "
+          f"{summary['files_with_issues']} files ({summary['wall_seconds']:.2f}s)")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if summary['issues'] or summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
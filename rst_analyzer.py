@@ -1,19 +1,76 @@
-from docutils.core import publish_doctree
-from docutils import nodes
+import argparse
 import json
+import os
 import re
+import time
 from collections import Counter
+from itertools import repeat
+
+from rst_common import find_rst_files
+
+# Analysis depths: 'fast' counts directives with the source regexes only,
+# 'full' also parses the document with docutils and walks the tree
+DEPTHS = ('fast', 'full')
+
+# Node types that are too common to be worth listing as custom elements
+COMMON_ELEMENTS = frozenset(('document', 'section', 'paragraph', 'text', 'title', 'reference',
+                             'target', 'literal', 'emphasis', 'strong', 'title_reference'))
+
+def new_stats():
+    """Return an empty stats dict."""
+    return {
+        'directives': Counter(),
+        'roles': Counter(),
+        'admonitions': Counter(),
+        'raw_html': 0,
+        'sections': [],
+        'custom_elements': [],
+        'timings': Counter()
+    }
+
+def merge_stats(total, stats):
+    """Merge one stats dict into another and return the total.
+    
+    Counters and counts are summed, section lists concatenated and custom
+    elements unioned in first-seen order.
+    """
+    for key in ('directives', 'roles', 'admonitions', 'timings'):
+        total[key].update(stats[key])
+    total['raw_html'] += stats['raw_html']
+    total['sections'].extend(stats['sections'])
+    seen = set(total['custom_elements'])
+    for element in stats['custom_elements']:
+        if element not in seen:
+            seen.add(element)
+            total['custom_elements'].append(element)
+    return total
+
+def build_report(stats):
+    """Build a report dict from a stats dict."""
+    return {
+        'summary': {
+            'total_directives': sum(stats['directives'].values()),
+            'unique_directives': len(stats['directives']),
+            'total_raw_html': stats['raw_html'],
+            'total_admonitions': sum(stats['admonitions'].values()),
+            'total_sections': len(stats['sections']),
+            'total_seconds': sum(stats['timings'].values())
+        },
+        'directives': dict(stats['directives']),
+        'roles': dict(stats['roles']),
+        'admonitions': dict(stats['admonitions']),
+        'sections': stats['sections'],
+        'custom_elements': stats['custom_elements'],
+        'timings': dict(stats['timings'])
+    }
 
 class SimpleRSTAnalyzer:
-    def __init__(self):
-        self.stats = {
-            'directives': Counter(),
-            'roles': Counter(),
-            'admonitions': Counter(),
-            'raw_html': 0,
-            'sections': [],
-            'custom_elements': []
-        }
+    def __init__(self, depth='full'):
+        if depth not in DEPTHS:
+            raise ValueError(f"Unknown depth {depth!r}, expected one of {', '.join(DEPTHS)}")
+        self.depth = depth
+        self.stats = new_stats()
+        self._custom_seen = set()
         # Regex patterns to find directives in the source
         self.directive_pattern = re.compile(r'\.\. +([a-zA-Z0-9_-]+)::', re.MULTILINE)
         self.raw_html_pattern = re.compile(r'\.\. +raw:: +html', re.MULTILINE)
@@ -25,82 +82,151 @@ class SimpleRSTAnalyzer:
             with open(rst_file, 'r', encoding='utf-8') as f:
                 content = f.read()
             
-            # Use regex to find directives in the source
-            directives = self.directive_pattern.findall(content)
-            for directive in directives:
-                self.stats['directives'][directive] += 1
-                
-            # Find raw HTML blocks
-            raw_html_blocks = self.raw_html_pattern.findall(content)
-            self.stats['raw_html'] = len(raw_html_blocks)
-            
-            # Find admonitions
-            admonitions = self.admonition_pattern.findall(content)
-            for admonition in admonitions:
-                self.stats['admonitions'][admonition] += 1
-            
-            # Parse the RST into a document tree for more detailed analysis
-            doctree = publish_doctree(content)
-            
-            # Process the document tree
-            self._process_node(doctree)
-            
-            return self.stats
+            return self.analyze_content(content)
             
         except Exception as e:
             print(f"Error processing {rst_file}: {e}")
             return None
     
-    def _process_node(self, node):
-        """Process a node in the document tree."""
-        # Check for roles
-        if hasattr(node, 'tagname') and node.tagname == 'title_reference':
-            self.stats['roles']['title_reference'] += 1
+    def analyze_content(self, content, doctree=None):
+        """Analyze RST source text, adding its counts to self.stats.
+        
+        Pass the doctree if the content has already been parsed, for example
+        by the converter's docutils engine, to skip parsing it again.
+        """
+        start = time.perf_counter()
+        
+        # Use regex to find directives in the source
+        directives = self.directive_pattern.findall(content)
+        for directive in directives:
+            self.stats['directives'][directive] += 1
             
-        # Check for sections
-        if isinstance(node, nodes.section):
-            title = ''
-            for child in node.children:
-                if isinstance(child, nodes.title):
-                    title = child.astext()
-                    break
-            self.stats['sections'].append({
-                'title': title,
-                'level': len(node.get('ids', []))
-            })
+        # Find raw HTML blocks
+        raw_html_blocks = self.raw_html_pattern.findall(content)
+        self.stats['raw_html'] += len(raw_html_blocks)
+        
+        # Find admonitions
+        admonitions = self.admonition_pattern.findall(content)
+        for admonition in admonitions:
+            self.stats['admonitions'][admonition] += 1
+        
+        scanned = time.perf_counter()
+        self.stats['timings']['scan_seconds'] += scanned - start
+        
+        if self.depth == 'fast':
+            return self.stats
+        
+        # Parse the RST into a document tree for more detailed analysis
+        if doctree is None:
+            # docutils is slow to import, so fast mode never loads it
+            from docutils.core import publish_doctree
+            doctree = publish_doctree(content)
+        parsed = time.perf_counter()
+        self.stats['timings']['parse_seconds'] += parsed - scanned
+        
+        # Process the document tree
+        self._process_node(doctree)
+        self.stats['timings']['walk_seconds'] += time.perf_counter() - parsed
+        
+        return self.stats
+    
+    def _process_node(self, root):
+        """Process a document tree in document order without recursion."""
+        from docutils import nodes
+        
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            tagname = getattr(node, 'tagname', None)
             
-        # Check for custom elements or extensions
-        if hasattr(node, 'tagname') and node.tagname not in ('document', 'section', 'paragraph', 'text'):
-            if node.tagname not in ('title', 'reference', 'target', 'literal', 'emphasis', 'strong', 'title_reference'):
-                if node.tagname not in self.stats['custom_elements']:
-                    self.stats['custom_elements'].append(node.tagname)
+            # Check for roles
+            if tagname == 'title_reference':
+                self.stats['roles']['title_reference'] += 1
+                
+            # Check for sections
+            if isinstance(node, nodes.section):
+                title = ''
+                for child in node.children:
+                    if isinstance(child, nodes.title):
+                        title = child.astext()
+                        break
+                self.stats['sections'].append({
+                    'title': title,
+                    'level': len(node.get('ids', []))
+                })
                 
-        # Process children recursively
-        if hasattr(node, 'children'):
-            for child in node.children:
-                self._process_node(child)
+            # Check for custom elements or extensions
+            if tagname is not None and tagname not in COMMON_ELEMENTS and tagname not in self._custom_seen:
+                self._custom_seen.add(tagname)
+                self.stats['custom_elements'].append(tagname)
+                
+            # Visit children next, first child on top of the stack
+            children = getattr(node, 'children', None)
+            if children:
+                stack.extend(reversed(children))
     
     def generate_report(self):
         """Generate a detailed report of RST usage patterns."""
-        report = {
-            'summary': {
-                'total_directives': sum(self.stats['directives'].values()),
-                'unique_directives': len(self.stats['directives']),
-                'total_raw_html': self.stats['raw_html'],
-                'total_admonitions': sum(self.stats['admonitions'].values()),
-                'total_sections': len(self.stats['sections'])
-            },
-            'directives': dict(self.stats['directives']),
-            'roles': dict(self.stats['roles']),
-            'admonitions': dict(self.stats['admonitions']),
-            'sections': self.stats['sections'],
-            'custom_elements': self.stats['custom_elements']
-        }
-        
-        return report
+        return build_report(self.stats)
+
+def _analyze_one(rst_file, depth='full'):
+    """Analyze one file with a fresh analyzer and return (path, stats, error)."""
+    analyzer = SimpleRSTAnalyzer(depth=depth)
+    try:
+        with open(rst_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return rst_file, analyzer.analyze_content(content), None
+    except Exception as e:
+        return rst_file, None, f"{type(e).__name__}: {e}"
+
+def analyze_corpus(root, workers=None, depth='full'):
+    """Analyze every RST file under root in parallel.
+    
+    Returns the combined report, a per-file report keyed by path, and a list
+    of files that could not be analyzed.
+    """
+    rst_files = find_rst_files(root)
+    workers = workers or os.cpu_count() or 1
+    
+    if workers == 1 or len(rst_files) <= 1:
+        results = [_analyze_one(rst_file, depth) for rst_file in rst_files]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        chunksize = max(1, len(rst_files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_analyze_one, rst_files, repeat(depth),
+                                        chunksize=chunksize))
+    
+    total = new_stats()
+    files = {}
+    errors = []
+    for rst_file, stats, error in results:
+        if stats is None:
+            errors.append({'source': rst_file, 'error': error})
+            continue
+        merge_stats(total, stats)
+        files[os.path.relpath(rst_file, root)] = build_report(stats)
+    
+    return {
+        'combined': build_report(total),
+        'files': files,
+        'errors': errors
+    }
 
 if __name__ == "__main__":
-    analyzer = SimpleRSTAnalyzer()
-    stats = analyzer.analyze_file('integrations.rst')
-    report = analyzer.generate_report()
+    parser = argparse.ArgumentParser(description='Inventory the RST features used in a file or directory.')
+    parser.add_argument('path', nargs='?', default='integrations.rst',
+                        help='RST file or directory of RST files (default: integrations.rst)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='Number of worker processes for directories (default: all cores)')
+    parser.add_argument('--depth', choices=DEPTHS, default='full',
+                        help="'fast' skips the docutils parse and only counts directives (default: full)")
+    args = parser.parse_args()
+    
+    if os.path.isdir(args.path):
+        report = analyze_corpus(args.path, workers=args.workers, depth=args.depth)
+    else:
+        analyzer = SimpleRSTAnalyzer(depth=args.depth)
+        stats = analyzer.analyze_file(args.path)
+        report = analyzer.generate_report()
     print(json.dumps(report, indent=2))
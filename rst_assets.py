@@ -0,0 +1,189 @@
+"""
+Content-addressed image assets for converted documents.
+Every local image the converter emits is hashed and placed once in the
+output tree under its digest, so a screenshot used on many pages is stored
+once. Files are cloned with a reflink where the filesystem allows and
+copied otherwise, and the image references in the Markdown are
+rewritten to the placed file. Source digests are cached by size and mtime
+so unchanged images are neither rehashed nor placed again.
+"""
+
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import threading
+from collections import Counter
+
+from rst_common import FenceTracker, atomic_write_json, quote_prefix_pattern
+
+# Directory in the output tree that holds the placed images
+ASSET_DIR = '_images'
+
+# Digest cache, kept in the output directory next to the manifest
+ASSET_INDEX_NAME = '.rst2md-assets.json'
+
+# Hex digits of the SHA-256 digest used in asset names
+DIGEST_LENGTH = 20
+
+# ioctl that clones a file's extents on Linux filesystems such as Btrfs and XFS, from <linux/fs.h>
+FICLONE = 0x40049409
+
+image_pattern = re.compile(r'(!\[[^\]]*\]\()([^)\s]+)(\))|(<img\s[^>]*?\bsrc=")([^"]+)(")', re.IGNORECASE)
+external_pattern = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*:|//|/|#)')
+
+
+def _reflink(source, target):
+    """Clone source to target with FICLONE, raising OSError where that isn't supported."""
+    import fcntl
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def place_file(source, target):
+    """Put a copy of source at target, the cheapest way the filesystem allows.
+
+    A reflink shares blocks copy-on-write, so it avoids copying bytes while
+    the asset keeps its content when the source is later edited in place.
+    Sources are never hardlinked: the asset is named by its content and
+    must not change with them. Returns the method used: 'reflink' or 'copy'.
+    """
+    temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        for method in ('reflink', 'copy'):
+            try:
+                if method == 'reflink':
+                    _reflink(source, temporary)
+                else:
+                    shutil.copyfile(source, temporary)
+            except (OSError, ImportError):
+                if os.path.exists(temporary):
+                    os.unlink(temporary)
+                if method == 'copy':
+                    raise
+                continue
+            # Another worker may place the same asset at the same time; either copy will do
+            os.replace(temporary, target)
+            return method
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+class AssetStore:
+    """Places images in the output tree by content and rewrites references to them.
+
+    digests maps each source image's absolute path to [size, mtime_ns,
+    digest], as saved by save(). Safe to share between threads; with a
+    process pool, each worker has its own store and hands its new digests
+    back through take_updates().
+    """
+
+    def __init__(self, output_dir, digests=None):
+        self.output_dir = os.path.abspath(output_dir)
+        self.digests = dict(digests or {})
+        self.stats = Counter()
+        self._updates = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, output_dir):
+        """Load the digest cache saved in output_dir, or return an empty store."""
+        try:
+            with open(os.path.join(output_dir, ASSET_INDEX_NAME), 'r', encoding='utf-8') as f:
+                digests = json.load(f)
+        except (OSError, ValueError):
+            digests = {}
+        return cls(output_dir, digests)
+
+    def save(self):
+        """Atomically write the digest cache, dropping images that no longer exist."""
+        path = os.path.join(self.output_dir, ASSET_INDEX_NAME)
+        with self._lock:
+            digests = {source: entry for source, entry in self.digests.items() if os.path.exists(source)}
+        atomic_write_json(path, digests, indent=1, sort_keys=True)
+
+    def merge(self, updates):
+        """Add digests computed elsewhere, such as by a worker process."""
+        with self._lock:
+            self.digests.update(updates)
+
+    def take_updates(self):
+        """Return and forget the digests computed since the last call."""
+        with self._lock:
+            updates, self._updates = self._updates, {}
+        return updates
+
+    def _digest(self, path, stat):
+        with self._lock:
+            cached = self.digests.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        entry = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()[:DIGEST_LENGTH]]
+        with self._lock:
+            self.stats['hashed'] += 1
+            self.digests[path] = entry
+            self._updates[path] = entry
+        return entry[2]
+
+    def place(self, path):
+        """Place one image and return (asset path relative to the output root, stat of the source)."""
+        stat = os.stat(path)
+        extension = os.path.splitext(path)[1].lower()
+        name = f"{ASSET_DIR}/{self._digest(path, stat)}{extension}"
+        target = os.path.join(self.output_dir, *name.split('/'))
+        try:
+            existing = os.stat(target)
+        except OSError:
+            existing = None
+        # Named by content, so an asset of the right size is already the right file, unless
+        # an older version hardlinked it to a source that may have been edited since
+        if existing is not None and existing.st_size == stat.st_size and existing.st_nlink == 1:
+            with self._lock:
+                self.stats['unchanged'] += 1
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            method = place_file(path, target)
+            with self._lock:
+                self.stats[method] += 1
+        return name, stat
+
+    def rewrite(self, markdown, source_path, md_file, deps=None):
+        """Place the local images referenced in markdown and point the references at them.
+
+        Image paths are resolved relative to source_path and the new links
+        are relative to md_file. Images inside code fences, external URLs
+        and paths that don't exist are left alone. deps, if given, receives
+        the mtime of every image placed, keyed by path.
+        """
+        base = os.path.dirname(os.path.abspath(source_path))
+        md_dir = posixpath.dirname(os.path.relpath(os.path.abspath(md_file), self.output_dir).replace(os.sep, '/'))
+
+        def replace(match):
+            prefix, src, suffix = match.group(1, 2, 3) if match.group(1) else match.group(4, 5, 6)
+            if external_pattern.match(src):
+                return match.group(0)
+            path = os.path.normpath(os.path.join(base, src.split('?', 1)[0]))
+            if not os.path.isfile(path):
+                with self._lock:
+                    self.stats['missing'] += 1
+                return match.group(0)
+            name, stat = self.place(path)
+            if deps is not None:
+                deps[path] = stat.st_mtime_ns
+            return prefix + posixpath.relpath(name, md_dir or '.') + suffix
+
+        lines = markdown.split('\n')
+        fence = FenceTracker()
+        for i, line in enumerate(lines):
+            if fence.feed(quote_prefix_pattern.sub('', line)):
+                continue
+            if 'src=' in line or '](' in line:
+                lines[i] = image_pattern.sub(replace, line)
+        return '\n'.join(lines)
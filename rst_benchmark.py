@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the RST converter and analyzer.
+Generates synthetic RST documents of configurable size and feature mix, times
+convert_content, each regex pipeline stage and analyze_file across a range of
+sizes, and saves the results as JSON so runs can be compared for regressions.
+A pathological mode times inputs that used to make a conversion engine
+superlinear and fails if any of them stops scaling linearly.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from rst_analyzer import SimpleRSTAnalyzer
+from rst_to_md_converter_updated import CONVERTER_VERSION, ENGINES, STAGES, RSTToMarkdownConverter
+
+# Default document sizes, from a small page to a generated reference dump
+DEFAULT_SIZES = ('10K', '100K', '1M', '10M', '50M')
+
+# Relative weight of each feature in a generated document
+DEFAULT_MIX = {
+    'header': 2,
+    'paragraph': 6,
+    'link': 4,
+    'admonition': 3,
+    'nested_admonition': 1,
+    'raw_pre': 2,
+    'raw_style': 1,
+    'image': 2,
+    'literal': 2
+}
+
+# Inputs that once made a conversion engine superlinear, each built from one repeated unit
+PATHOLOGICAL_CASES = {
+    'comments': '.. comment line\n',
+    'blank_runs': ' \n',
+    'indented_body': '   body text line\n',
+    'actblue': '   Select "ActBlue Default" here\n',
+    'raw_in_quote': '   .. raw:: html\n\n      <pre>x</pre>\n\n',
+    'image_options': '   :alt: x\n\n',
+    'unclosed_simple_table': '=== ===\nx\n\n',
+    'unclosed_grid_table': '+---+---+\n| x\n',
+}
+PATHOLOGICAL_PREFIX = {
+    'blank_runs': 'Para\n',
+    'indented_body': '.. note::\n\n',
+    'actblue': '.. note::\n\n',
+    'raw_in_quote': '.. note::\n\n',
+    'image_options': '.. image:: a.png\n',
+}
+PATHOLOGICAL_SIZES = ('100K', '400K', '1600K')
+
+# Smaller sizes for check_pathological, quick enough to run on every change
+CHECK_SIZES = ('25K', '100K', '400K')
+
+# Largest scaling exponent a pathological case may show; 1 is linear, 2 quadratic
+MAX_PATHOLOGICAL_EXPONENT = 1.4
+
+# Slowdown beyond which a comparison flags a regression, ignoring differences
+# below MIN_DELTA seconds, which are timer noise
+REGRESSION_THRESHOLD = 1.2
+MIN_DELTA = 0.002
+
+WORDS = ('actionkit', 'mailing', 'donation', 'page', 'user', 'field', 'report', 'event',
+         'campaign', 'import', 'list', 'the', 'a', 'to', 'of', 'and', 'with', 'for')
+
+
+def parse_size(text):
+    """Parse a size such as 10K, 1M or 2048 into bytes."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip('B')
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _feature(name, rng, n):
+    """Return the RST source for one instance of a feature."""
+    if name == 'header':
+        title = f"Section {n} {rng.choice(WORDS).capitalize()}"
+        return f"{title}\n{rng.choice('=-~*^') * len(title)}\n"
+    elif name == 'paragraph':
+        return ' '.join(_sentence(rng) for _ in range(rng.randint(2, 5))) + '\n'
+    elif name == 'link':
+        return f"See `{rng.choice(WORDS)} docs <https://example.com/{n}/>`_ for {_sentence(rng, 6)}\n"
+    elif name == 'admonition':
+        directive = rng.choice(('note', 'warning', 'tip'))
+        return f".. {directive}::\n\n   {_sentence(rng)}\n   {_sentence(rng)}\n"
+    elif name == 'nested_admonition':
+        return (f".. admonition:: vendor-managed integration\n\n"
+                f"   `Vendor {n} <https://vendor{n}.example.com/>`_ {_sentence(rng)}\n\n"
+                f"   * {_sentence(rng)} For the endpoint URL follow this format:\n\n"
+                f"     .. raw:: html\n\n"
+                f"        <pre>https://[your actionkit hostname]/webhooks/{n}/?backfill=1</pre>\n\n"
+                f"   * {_sentence(rng)}\n\n"
+                f"   .. image:: https://example.com/images/{n}.png\n"
+                f"      :alt: Screenshot {n}\n"
+                f"      :width: 600px\n"
+                f"      :align: center\n"
+                f"      :class: image-with-margin\n")
+    elif name == 'raw_pre':
+        return f".. raw:: html\n\n   <pre>curl https://example.com/rest/v1/{n}/</pre>\n"
+    elif name == 'raw_style':
+        return ".. raw:: html\n\n   <style>\n       pre {\n           white-space: pre-wrap;\n       }\n   </style>\n"
+    elif name == 'image':
+        return (f".. image:: images/shot-{n}.png\n"
+                f"   :alt: Shot {n}\n"
+                f"   :width: {rng.choice((300, 400, 600))}px\n"
+                f"   :align: {rng.choice(('left', 'center'))}\n")
+    elif name == 'literal':
+        lines = '\n'.join(f"    {rng.choice(WORDS)} = {i}" for i in range(rng.randint(2, 6)))
+        return f"Example::\n\n{lines}\n"
+    raise ValueError(f"Unknown feature {name!r}")
+
+
+def generate_document(size, mix=None, seed=0):
+    """Generate a synthetic RST document of roughly size bytes."""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    parts = ["Synthetic Document\n==================\n"]
+    total = len(parts[0])
+    n = 0
+    while total < size:
+        n += 1
+        part = _feature(rng.choices(names, weights)[0], rng, n)
+        parts.append(part)
+        total += len(part) + 1
+    return '\n'.join(parts)
+
+
+def pathological_document(case, size):
+    """Return a document of roughly size bytes made by repeating a pathological case."""
+    unit = PATHOLOGICAL_CASES[case]
+    return PATHOLOGICAL_PREFIX.get(case, '') + unit * max(1, size // len(unit))
+
+
+def _best_time(func, repeat):
+    """Return the fastest wall time of func over repeat runs, and its last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def benchmark_size(content, engines, repeat=1, analyze_full=True):
+    """Time every benchmark target on one document and return {target: seconds}."""
+    timings = {}
+
+    for engine in engines:
+        converter = RSTToMarkdownConverter(engine=engine)
+        timings[f"convert_content[{engine}]"], _ = _best_time(lambda: converter.convert_content(content), repeat)
+
+    # Each stage is timed on the output of the stage before it, as in convert_content
+    converter = RSTToMarkdownConverter()
+    staged = content
+    for stage in STAGES:
+        method = getattr(converter, stage)
+        timings[f"stage:{stage}"], staged = _best_time(lambda: method(staged), repeat)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.rst', encoding='utf-8', delete=False) as f:
+        f.write(content)
+    try:
+        depths = ['fast', 'full'] if analyze_full else ['fast']
+        for depth in depths:
+            timings[f"analyze_file[{depth}]"], _ = _best_time(
+                lambda: SimpleRSTAnalyzer(depth=depth).analyze_file(f.name), repeat)
+    finally:
+        os.unlink(f.name)
+
+    return timings
+
+
+def scaling_exponents(results):
+    """Estimate how each target scales with size, as the exponent k in time ~ size**k.
+
+    An exponent near 1 is linear; near 2 is quadratic.
+    """
+    exponents = {}
+    targets = {target for run in results for target in run['timings']}
+    for target in sorted(targets):
+        points = [(run['size'], run['timings'][target]) for run in results
+                  if target in run['timings'] and run['timings'][target] > 0]
+        if len(points) < 2:
+            continue
+        (s1, t1), (s2, t2) = points[0], points[-1]
+        exponents[target] = math.log(t2 / t1) / math.log(s2 / s1)
+    return exponents
+
+
+def run_benchmark(sizes, mix=None, engines=('regex', 'lexer'), repeat=1, seed=0,
+                  analyze_full_limit=1024 ** 2, progress=None):
+    """Run the benchmark over a list of byte sizes and return a JSON-ready dict."""
+    results = []
+    for size in sizes:
+        content = generate_document(size, mix, seed)
+        analyze_full = analyze_full_limit is None or size <= analyze_full_limit
+        timings = benchmark_size(content, engines, repeat, analyze_full)
+        results.append({'requested_size': size, 'size': len(content), 'timings': timings})
+        if progress:
+            progress(results[-1])
+
+    return {
+        'converter_version': CONVERTER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'mix': mix or DEFAULT_MIX,
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+        'scaling': scaling_exponents(results)
+    }
+
+
+def run_pathological(sizes, engines=('regex', 'lexer'), repeat=1, progress=None):
+    """Time convert_content on every pathological case and return a JSON-ready dict.
+
+    'failures' lists the case and target of every exponent above
+    MAX_PATHOLOGICAL_EXPONENT.
+    """
+    cases = {}
+    failures = []
+    for case in PATHOLOGICAL_CASES:
+        results = []
+        for size in sizes:
+            content = pathological_document(case, size)
+            timings = {}
+            for engine in engines:
+                converter = RSTToMarkdownConverter(engine=engine)
+                timings[f"convert_content[{engine}]"], _ = _best_time(
+                    lambda: converter.convert_content(content), repeat)
+            results.append({'requested_size': size, 'size': len(content), 'timings': timings})
+        scaling = scaling_exponents(results)
+        cases[case] = {'results': results, 'scaling': scaling}
+        for target, exponent in scaling.items():
+            if exponent > MAX_PATHOLOGICAL_EXPONENT:
+                failures.append({'case': case, 'target': target, 'exponent': exponent})
+        if progress:
+            progress(case, cases[case])
+
+    return {
+        'converter_version': CONVERTER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'max_exponent': MAX_PATHOLOGICAL_EXPONENT,
+        'cases': cases,
+        'failures': failures
+    }
+
+
+def check_pathological(sizes=CHECK_SIZES, engines=('regex', 'lexer'), repeat=3):
+    """Assert that every pathological case converts in linear time with every engine.
+
+    Raises AssertionError naming each case and engine whose scaling
+    exponent is above MAX_PATHOLOGICAL_EXPONENT; returns the report otherwise.
+    """
+    report = run_pathological([parse_size(size) for size in sizes], engines, repeat)
+    assert not report['failures'], 'Superlinear conversion: ' + ', '.join(
+        f"{failure['target']} on {failure['case']} (exponent {failure['exponent']:.2f})"
+        for failure in report['failures'])
+    return report
+
+
+def compare_runs(baseline, current, threshold=REGRESSION_THRESHOLD, min_delta=MIN_DELTA):
+    """Return the targets that got slower than threshold times the baseline at a matching size."""
+    baseline_by_size = {run['requested_size']: run['timings'] for run in baseline['results']}
+    regressions = []
+    for run in current['results']:
+        previous = baseline_by_size.get(run['requested_size'])
+        if previous is None:
+            continue
+        for target, seconds in run['timings'].items():
+            if target not in previous or previous[target] <= 0 or seconds - previous[target] < min_delta:
+                continue
+            if seconds / previous[target] > threshold:
+                regressions.append({
+                    'size': run['requested_size'],
+                    'target': target,
+                    'baseline_seconds': previous[target],
+                    'seconds': seconds,
+                    'ratio': seconds / previous[target]
+                })
+    return regressions
+
+
+def _print_run(run):
+    print(f"\n{run['size']:,} bytes")
+    for target, seconds in run['timings'].items():
+        rate = run['size'] / seconds / 1024 ** 2 if seconds else float('inf')
+        print(f"  {target:45} {seconds:10.4f}s {rate:9.2f} MB/s")
+
+
+def _print_case(case, data):
+    print(f"\n{case}")
+    for run in data['results']:
+        times = '  '.join(f"{target} {seconds:.4f}s" for target, seconds in run['timings'].items())
+        print(f"  {run['size']:>12,} bytes  {times}")
+    for target, exponent in data['scaling'].items():
+        print(f"  scaling {target:40} {exponent:6.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the RST converter and analyzer on synthetic documents.')
+    parser.add_argument('--sizes',
+                        help=f"Comma-separated document sizes (default: {','.join(DEFAULT_SIZES)}, "
+                             f"or {','.join(PATHOLOGICAL_SIZES)} with --pathological)")
+    parser.add_argument('--mix', action='append', default=[], metavar='FEATURE=WEIGHT',
+                        help=f"Override a feature weight; features: {', '.join(DEFAULT_MIX)}")
+    parser.add_argument('--engines', default='regex,lexer',
+                        help=f"Comma-separated engines for convert_content (choices: {', '.join(ENGINES)})")
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per measurement; the fastest is kept')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated documents')
+    parser.add_argument('--analyze-full-limit', default='1M',
+                        help='Largest size analyzed with the full docutils parse (default: 1M)')
+    parser.add_argument('-o', '--output', help='Write results as JSON to this path')
+    parser.add_argument('--compare', help='Baseline results JSON to check for regressions')
+    parser.add_argument('--pathological', action='store_true',
+                        help='Time inputs that used to backtrack and fail if any scales worse than '
+                             f'size**{MAX_PATHOLOGICAL_EXPONENT}')
+    parser.add_argument('--check', action='store_true',
+                        help=f"Assert that the pathological cases scale linearly at {','.join(CHECK_SIZES)}, "
+                             'a quick check for every change')
+    parser.add_argument('--save-sample', metavar='SIZE',
+                        help='Write one generated document of SIZE to stdout and exit')
+    args = parser.parse_args(argv)
+
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix:
+        name, _, weight = item.partition('=')
+        if name not in mix:
+            parser.error(f"unknown feature {name!r}")
+        mix[name] = float(weight)
+
+    if args.save_sample:
+        sys.stdout.write(generate_document(parse_size(args.save_sample), mix, args.seed))
+        return 0
+
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error(f"unknown engine {engine!r}")
+
+    if args.check:
+        check_pathological(engines=engines)
+        print(f"All {len(PATHOLOGICAL_CASES)} pathological cases scale linearly")
+        return 0
+
+    if args.pathological:
+        sizes = [parse_size(size) for size in (args.sizes or ','.join(PATHOLOGICAL_SIZES)).split(',')]
+        report = run_pathological(sizes, engines, args.repeat, progress=_print_case)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        for failure in report['failures']:
+            print(f"SUPERLINEAR {failure['target']} on {failure['case']}: "
+                  f"exponent {failure['exponent']:.2f} > {MAX_PATHOLOGICAL_EXPONENT}")
+        return 1 if report['failures'] else 0
+
+    sizes = [parse_size(size) for size in (args.sizes or ','.join(DEFAULT_SIZES)).split(',')]
+    report = run_benchmark(sizes, mix, engines, args.repeat, args.seed,
+                           parse_size(args.analyze_full_limit), progress=_print_run)
+
+    print("\nScaling exponent (1 = linear, 2 = quadratic)")
+    for target, exponent in report['scaling'].items():
+        print(f"  {target:45} {exponent:6.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_runs(baseline, report)
+        for r in regressions:
+            print(f"REGRESSION {r['target']} at {r['size']:,} bytes: "
+                  f"{r['baseline_seconds']:.4f}s -> {r['seconds']:.4f}s ({r['ratio']:.2f}x)")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+Single-pass block lexer for RST documents.
+The lexer reads lines once, from any iterable, and yields one dict per
+top-level block (headers, directives with their indented bodies, literal
+blocks, tables, lists and paragraphs). Nested bodies are returned dedented so the
+same lexer can be run on them again.
+"""
+
+import re
+from collections import deque
+
+from rst_tables import table_extent
+
+# Patterns for the start of each block type
+underline_pattern = re.compile(r'^([=~\-`\'":^_*+#])\1{2,}\s*$')
+directive_pattern = re.compile(r'^\.\.\s+([a-zA-Z0-9_-]+)::\s*(.*)$')
+comment_pattern = re.compile(r'^\.\.(\s|$)')
+list_item_pattern = re.compile(r'^([*+-]|\d+\.|#\.)(\s+|$)')
+option_pattern = re.compile(r'^:([a-zA-Z0-9_-]+):\s*(.*)$')
+
+
+class LineReader:
+    """Iterator over lines with a small lookahead buffer."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = deque()
+
+    def peek(self, offset=0):
+        """Return the line offset places ahead without consuming it, or None."""
+        while len(self._buffer) <= offset:
+            line = next(self._lines, None)
+            if line is None:
+                return None
+            self._buffer.append(line.rstrip('\r\n'))
+        return self._buffer[offset]
+
+    def next(self):
+        """Consume and return the next line, or None at the end of input."""
+        line = self.peek()
+        if line is not None:
+            self._buffer.popleft()
+        return line
+
+
+def is_blank(line):
+    """Return True if the line contains only whitespace."""
+    return not line.strip()
+
+
+def is_indented(line):
+    """Return True if the line starts with whitespace."""
+    return line[:1] in (' ', '\t')
+
+
+def indentation(line):
+    """Return the width of the leading whitespace of a line."""
+    return len(line) - len(line.lstrip())
+
+
+def dedent(lines):
+    """Remove the common leading whitespace and surrounding blank lines."""
+    while lines and is_blank(lines[0]):
+        lines = lines[1:]
+    while lines and is_blank(lines[-1]):
+        lines = lines[:-1]
+    widths = [indentation(line) for line in lines if not is_blank(line)]
+    width = min(widths) if widths else 0
+    return [line[width:] if not is_blank(line) else '' for line in lines]
+
+
+def read_indented(reader):
+    """Consume blank and indented lines, stopping before the next unindented line."""
+    lines = []
+    while True:
+        line = reader.peek()
+        if line is None or not (is_blank(line) or is_indented(line)):
+            break
+        lines.append(reader.next())
+    return lines
+
+
+def split_options(lines):
+    """Split the indented lines of a directive body into its :option: fields and content.
+
+    Options are only read from the lines directly after the directive, before
+    the first blank line, so content that starts with a role such as
+    :ref:`label` is kept as content.
+    """
+    options = {}
+    i = 0
+    while i < len(lines):
+        match = option_pattern.match(lines[i].strip())
+        if not match:
+            break
+        options[match.group(1).lower()] = match.group(2).strip()
+        i += 1
+    return options, dedent(lines[i:])
+
+
+def _is_header_at(reader):
+    """Return True if the next line is a title followed by an underline."""
+    line = reader.peek()
+    following = reader.peek(1)
+    return (following is not None and not is_blank(line) and not is_indented(line)
+            and not underline_pattern.match(line) and underline_pattern.match(following) is not None)
+
+
+def _read_list(reader, first_match):
+    """Consume consecutive list items of the same kind."""
+    bullet = first_match.group(1)
+    ordered = bullet not in ('*', '+', '-')
+    items = []
+    loose = False
+    while True:
+        line = reader.next()
+        match = list_item_pattern.match(line)
+        offset = len(match.group(0))
+        body = [line[offset:]]
+        for body_line in read_indented(reader):
+            width = min(offset, indentation(body_line))
+            body.append(body_line[width:] if not is_blank(body_line) else '')
+        items.append({'marker': match.group(1), 'lines': dedent(body)})
+
+        following = reader.peek()
+        next_match = list_item_pattern.match(following) if following is not None else None
+        if next_match is None or _is_header_at(reader):
+            break
+        next_ordered = next_match.group(1) not in ('*', '+', '-')
+        if next_ordered != ordered or (not ordered and next_match.group(1) != bullet):
+            break
+        # Blank lines between items make the whole list loose
+        loose = loose or is_blank(body[-1])
+
+    return {'type': 'list', 'ordered': ordered, 'items': items, 'loose': loose}
+
+
+def _skip_indented(lines, i):
+    """Return the index after the blank and indented lines starting at i, as read_indented reads them."""
+    while i < len(lines) and (is_blank(lines[i]) or is_indented(lines[i])):
+        i += 1
+    return i
+
+
+def _header_at(lines, i):
+    """Index-based _is_header_at: a title at line i followed by an underline."""
+    line = lines[i]
+    return (i + 1 < len(lines) and not is_blank(line) and not is_indented(line)
+            and not underline_pattern.match(line) and underline_pattern.match(lines[i + 1]) is not None)
+
+
+def section_starts(lines):
+    """Return the indexes of the lines that open top-level sections, after the first.
+
+    lines is a list of lines without line endings. The blocks are found the
+    way tokenize_blocks finds them, without building them, and the top level
+    is the style of the first title: its character and whether it has an
+    overline. Only titles straight after a blank line are used, so the
+    lines before each index tokenize exactly as they do in the whole
+    document, and the lines from it on start with that title.
+    """
+    starts = []
+    top = None
+    count = len(lines)
+    i = 0
+    while i < count:
+        line = lines[i]
+        if is_blank(line):
+            i += 1
+            continue
+        if is_indented(line):
+            i = _skip_indented(lines, i)
+            continue
+
+        following = lines[i + 1] if i + 1 < count else None
+        style = None
+        if underline_pattern.match(line) and following is not None and not is_blank(following):
+            closing = lines[i + 2] if i + 2 < count else None
+            if closing is not None and closing[:1] == line[:1] and underline_pattern.match(closing):
+                style = (line[0], True)
+        if style is None and _header_at(lines, i):
+            style = (following[0], False)
+        if style is not None:
+            if top is None:
+                top = style
+            elif style == top and is_blank(lines[i - 1]):
+                starts.append(i)
+            i += 3 if style[1] else 2
+            continue
+
+        if underline_pattern.match(line) and (following is None or is_blank(following)):
+            i += 1
+            continue
+        if line[:1] in ('+', '='):
+            extent = table_extent(lambda n: lines[i + n] if i + n < count else None)
+            if extent is not None:
+                i += extent
+                continue
+        if directive_pattern.match(line) or comment_pattern.match(line):
+            i = _skip_indented(lines, i + 1)
+            continue
+
+        match = list_item_pattern.match(line)
+        if match:
+            # Items of one list, as _read_list groups them
+            bullet = match.group(1)
+            ordered = bullet not in ('*', '+', '-')
+            while True:
+                i = _skip_indented(lines, i + 1)
+                next_match = list_item_pattern.match(lines[i]) if i < count else None
+                if next_match is None or _header_at(lines, i):
+                    break
+                next_ordered = next_match.group(1) not in ('*', '+', '-')
+                if next_ordered != ordered or (not ordered and next_match.group(1) != bullet):
+                    break
+            continue
+
+        # Paragraph, up to a blank line or a title
+        i += 1
+        while i < count and not is_blank(lines[i]) and not _header_at(lines, i):
+            i += 1
+    return starts
+
+
+def tokenize_blocks(lines):
+    """Yield the top-level blocks of an RST document.
+
+    Accepts any iterable of lines and reads it exactly once, so a block is
+    yielded as soon as the line after it has been seen.
+    """
+    reader = LineReader(lines)
+    expect_literal = False
+
+    while True:
+        line = reader.peek()
+        if line is None:
+            return
+
+        if is_blank(line):
+            reader.next()
+            continue
+
+        # Indented text is either a literal block (after ::) or a block quote
+        if is_indented(line):
+            body = dedent(read_indented(reader))
+            yield {'type': 'literal' if expect_literal else 'quote', 'lines': body}
+            expect_literal = False
+            continue
+
+        expect_literal = False
+        following = reader.peek(1)
+
+        # Title with both an overline and an underline
+        if underline_pattern.match(line) and following is not None and not is_blank(following):
+            closing = reader.peek(2)
+            if closing is not None and closing[:1] == line[:1] and underline_pattern.match(closing):
+                reader.next()
+                title = reader.next().strip()
+                reader.next()
+                yield {'type': 'header', 'title': title, 'char': line[0]}
+                continue
+
+        # Title with an underline
+        if _is_header_at(reader):
+            title = reader.next().strip()
+            char = reader.next()[0]
+            yield {'type': 'header', 'title': title, 'char': char}
+            continue
+
+        # Lone underline-style line is a transition
+        if underline_pattern.match(line) and (following is None or is_blank(following)):
+            reader.next()
+            yield {'type': 'transition'}
+            continue
+
+        # Grid and simple tables
+        if line[:1] in ('+', '='):
+            count = table_extent(reader.peek)
+            if count is not None:
+                yield {'type': 'table', 'lines': [reader.next() for _ in range(count)]}
+                continue
+
+        # Directive with its options and indented body
+        match = directive_pattern.match(line)
+        if match:
+            reader.next()
+            options, content = split_options(read_indented(reader))
+            yield {
+                'type': 'directive',
+                'name': match.group(1).lower(),
+                'argument': match.group(2).strip(),
+                'options': options,
+                'lines': content
+            }
+            continue
+
+        # Comments, targets and substitution definitions
+        if comment_pattern.match(line):
+            reader.next()
+            body = read_indented(reader)
+            yield {'type': 'comment', 'lines': [line] + body}
+            continue
+
+        # Bullet and enumerated lists
+        match = list_item_pattern.match(line)
+        if match:
+            yield _read_list(reader, match)
+            continue
+
+        # Paragraph runs to the next blank line or header
+        paragraph = [reader.next()]
+        while True:
+            line = reader.peek()
+            if line is None or is_blank(line) or _is_header_at(reader):
+                break
+            paragraph.append(reader.next())
+        expect_literal = paragraph[-1].rstrip().endswith('::')
+        yield {'type': 'paragraph', 'lines': paragraph}
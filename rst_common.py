@@ -0,0 +1,107 @@
+"""
+Helpers shared by the converter's tools.
+Finding source and output files, writing files atomically and following
+fenced code blocks in Markdown are needed by the batch converter, the
+analyzer, the validator and the indexes alike, so they live here once
+with one set of rules.
+"""
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+# A Markdown code fence: three or more backticks or tildes
+fence_pattern = re.compile(r'^(`{3,}|~{3,})')
+
+# Blockquote markers at the start of a Markdown line, nested or not; matches
+# the empty string on other lines, so match().end() is where the body starts
+quote_prefix_pattern = re.compile(r'^(?:\s*>\s?)*')
+
+
+def find_files(root, extension):
+    """Return all files below root ending in extension, sorted for stable output."""
+    found = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(extension):
+                found.append(os.path.join(dirpath, name))
+    return found
+
+
+def find_rst_files(root):
+    """Return all RST files below root, sorted for stable output."""
+    return find_files(root, '.rst')
+
+
+def find_md_files(root):
+    """Return all Markdown files below root, sorted for stable output."""
+    return find_files(root, '.md')
+
+
+@contextmanager
+def atomic_open(path):
+    """Open a file to write path through, so readers see either the old file or the new one.
+
+    Writes go to a temporary file in the same directory, named for this
+    process and thread so concurrent writers don't collide. It replaces
+    path when the block finishes, and is removed instead if the block
+    raises, leaving any previous file untouched. Missing directories are
+    created.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary, 'w', encoding='utf-8') as f:
+            yield f
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+
+def atomic_write(path, text):
+    """Write text to path so readers see either the old file or the new one, never part of it."""
+    with atomic_open(path) as f:
+        f.write(text)
+
+
+def atomic_write_json(path, data, **options):
+    """Atomically write data as JSON; options are passed on to json.dumps."""
+    atomic_write(path, json.dumps(data, **options))
+
+
+class FenceTracker:
+    """Follows fenced code blocks through Markdown, one line at a time.
+
+    A fence opens at a line starting with ``` or ~~~ and closes at a line
+    holding only a fence of the same character at least as long, as in
+    CommonMark. Callers strip blockquote markers first if quoted fences count.
+    """
+
+    def __init__(self):
+        # The fence of the open code block, or None outside one
+        self.fence = None
+        # Line number the open code block started on, as passed to feed()
+        self.line = 0
+
+    @property
+    def open(self):
+        return self.fence is not None
+
+    def feed(self, text, number=0):
+        """Return True if text opens, closes or lies inside a fenced code block."""
+        stripped = text.strip()
+        match = fence_pattern.match(stripped)
+        if self.fence is not None:
+            marker = match.group(1) if match else ''
+            if marker[:1] == self.fence[0] and len(marker) >= len(self.fence) and not stripped[len(marker):].strip():
+                self.fence = None
+            return True
+        if match:
+            self.fence = match.group(1)
+            self.line = number
+            return True
+        return False
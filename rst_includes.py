@@ -0,0 +1,209 @@
+"""
+include and literalinclude resolution for the RST converter.
+Each include directive is swapped for a placeholder line before conversion and
+the placeholder is replaced with the included file's Markdown afterwards, so
+every engine handles includes the same way. Included files are read and
+converted once per resolver, keyed by path and mtime, so a converter that is
+reused across a batch converts a shared snippet only once.
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+
+# Deepest chain of nested includes before giving up
+MAX_INCLUDE_DEPTH = 10
+
+include_pattern = re.compile(r'^(\s*)\.\.\s+(include|literalinclude)::\s*(.*?)\s*$')
+option_pattern = re.compile(r'^\s+:([a-zA-Z0-9_-]+):\s*(.*)$')
+# Lines whose indented body is literal text, where include directives are not resolved
+literal_start_pattern = re.compile(r'^(?!\s*\.\.\s).*::\s*$|^\s*\.\.\s+(?:code|code-block|sourcecode|literalinclude|raw)::')
+placeholder_pattern = re.compile(r'^(.*?)@@rst2md-include-(\d+)@@[ \t]*$', re.MULTILINE)
+
+
+def parse_line_ranges(spec, count):
+    """Turn a :lines: value such as 1,3,5-10,20- into zero-based line numbers."""
+    numbers = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, dash, end = part.partition('-')
+        first = int(start) if start else 1
+        last = (int(end) if end else count) if dash else first
+        numbers.extend(range(first - 1, min(last, count)))
+    return numbers
+
+
+def select_lines(text, options):
+    """Apply :start-line:, :end-line:, :start-after:, :end-before: and :lines: to text."""
+    lines = text.split('\n')
+    if 'start-line' in options or 'end-line' in options:
+        start = int(options.get('start-line') or 0)
+        end = int(options['end-line']) if options.get('end-line') else None
+        lines = lines[start:end]
+    text = '\n'.join(lines)
+
+    if 'start-after' in options:
+        marker = options['start-after']
+        index = text.find(marker)
+        if index < 0:
+            raise ValueError(f"start-after text {marker!r} not found")
+        text = text[index + len(marker):]
+        # The rest of the marker's line belongs to the marker
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+    if 'end-before' in options:
+        marker = options['end-before']
+        index = text.find(marker)
+        if index < 0:
+            raise ValueError(f"end-before text {marker!r} not found")
+        text = text[:index]
+        text = text.rsplit('\n', 1)[0] if '\n' in text else ''
+
+    if 'lines' in options:
+        lines = text.split('\n')
+        text = '\n'.join(lines[n] for n in parse_line_ranges(options['lines'], len(lines)))
+    return text
+
+
+def code_fence(code, language=''):
+    """Return code as a fenced Markdown code block."""
+    code = code.strip('\n')
+    return f"```{language}\n{code}\n```"
+
+
+class IncludeResolver:
+    """Reads, slices and converts included files, caching both the text and the Markdown.
+
+    Cache entries record the mtime of every file they were built from and
+    are rebuilt when any of them changes. Safe to share between threads.
+    """
+
+    def __init__(self, max_depth=MAX_INCLUDE_DEPTH):
+        self.max_depth = max_depth
+        self.stats = Counter()
+        self._sources = {}
+        self._converted = {}
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        """Return (text, mtime_ns) for path, reading it only if it changed."""
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._sources.get(path)
+            if cached is not None and cached[0] == mtime:
+                self.stats['read_hits'] += 1
+                return cached[1], mtime
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        with self._lock:
+            self.stats['reads'] += 1
+            self._sources[path] = (mtime, text)
+        return text, mtime
+
+    def _is_fresh(self, deps):
+        try:
+            return all(os.stat(path).st_mtime_ns == mtime for path, mtime in deps.items())
+        except OSError:
+            return False
+
+    def resolve(self, directive, argument, options, source_path, converter, stack):
+        """Return (markdown, deps) for one include or literalinclude directive.
+
+        deps maps every file the Markdown was built from to its mtime. stack
+        is the chain of files currently being included, used to detect cycles.
+        """
+        base = os.path.dirname(source_path) if source_path else ''
+        path = os.path.abspath(os.path.join(base, argument))
+        if path in stack:
+            chain = ' -> '.join(os.path.basename(p) for p in stack + (path,))
+            raise ValueError(f"Include cycle: {chain}")
+        if len(stack) > self.max_depth:
+            raise ValueError(f"Includes nested deeper than {self.max_depth} levels at {path}")
+
+        key = (directive, path, tuple(sorted(options.items())), converter.engine, converter._include_context())
+        with self._lock:
+            cached = self._converted.get(key)
+        fresh = cached is not None and self._is_fresh(cached[1])
+        with self._lock:
+            self.stats['hits' if fresh else 'misses'] += 1
+        if fresh:
+            return cached
+
+        text, mtime = self.read(path)
+        text = select_lines(text, options)
+        deps = {path: mtime}
+        if directive == 'literalinclude':
+            markdown = code_fence(text, options.get('language', ''))
+        elif 'literal' in options or 'code' in options:
+            markdown = code_fence(text, options.get('code', ''))
+        else:
+            markdown = converter._convert_source(text, path, stack + (path,), deps).rstrip('\n')
+
+        with self._lock:
+            self._converted[key] = (markdown, deps)
+        return markdown, deps
+
+    def expand(self, lines, source_path, converter, stack, slots, deps):
+        """Yield lines with each include directive replaced by a placeholder line.
+
+        The Markdown for each placeholder is stored in slots, and the files it
+        was built from are added to deps. Works lazily on any iterable of lines.
+        """
+        lines = iter(lines)
+        # Indentation of the line that opened the current literal block, if any
+        literal_indent = None
+        line = next(lines, None)
+        while line is not None:
+            line = line.rstrip('\r\n')
+            indent = len(line) - len(line.lstrip())
+            if literal_indent is not None and line.strip() and indent <= literal_indent:
+                literal_indent = None
+            match = include_pattern.match(line) if literal_indent is None else None
+            if not match:
+                if literal_indent is None and literal_start_pattern.match(line):
+                    literal_indent = indent
+                yield line
+                line = next(lines, None)
+                continue
+
+            indent, directive, argument = match.groups()
+            options = {}
+            line = next(lines, None)
+            while line is not None:
+                line = line.rstrip('\r\n')
+                option = option_pattern.match(line)
+                if not option or len(line) - len(line.lstrip()) <= len(indent):
+                    break
+                options[option.group(1).lower()] = option.group(2).strip()
+                line = next(lines, None)
+
+            markdown, included = self.resolve(directive, argument, options, source_path, converter, stack)
+            deps.update(included)
+            token = f"@@rst2md-include-{len(slots)}@@"
+            slots[token] = markdown
+            yield indent + token
+
+    def restore(self, markdown, slots):
+        """Replace placeholder lines with their Markdown, repeating the line's prefix.
+
+        A prefix of blockquote markers is normalised to '> ' per level, so
+        included content lines up whichever engine produced the quote.
+        """
+        if not slots:
+            return markdown
+
+        def replace(match):
+            prefix = match.group(1)
+            if '>' in prefix and not prefix.strip(' >'):
+                prefix = '> ' * prefix.count('>')
+            body = slots[f"@@rst2md-include-{match.group(2)}@@"]
+            return '\n'.join(prefix + line if line else prefix.rstrip() for line in body.split('\n'))
+
+        return placeholder_pattern.sub(replace, markdown)
+
+
+def has_includes(content):
+    """Cheap check for include directives, so documents without any skip expansion."""
+    return 'include::' in content
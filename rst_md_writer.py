@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+docutils-based Markdown writer for ActionKit documentation.
+The document is parsed once with docutils and Markdown is written by a
+NodeVisitor over the doctree. The same doctree can be handed to
+SimpleRSTAnalyzer, so a file can be analyzed and converted from one parse.
+"""
+
+import argparse
+import re
+import time
+from docutils.core import publish_doctree
+from docutils import nodes
+from docutils.parsers.rst import Parser, states
+
+from rst_tables import render_table
+
+# Roles resolved through the cross-reference index
+XREF_ROLES = ('ref', 'doc')
+
+# Node types that produce no Markdown output
+SKIPPED_NODES = (nodes.comment, nodes.target, nodes.system_message, nodes.substitution_definition)
+
+
+role_target_pattern = re.compile(r'^(.*?)\s*<([^<>]+)>$', re.DOTALL)
+
+
+def xref_role(name, rawtext, text, lineno, inliner, options=None, content=None):
+    """Resolve :ref: and :doc: through the cross-reference index passed to parse_rst.
+
+    Without an index, or when the target is unknown, the role's text is
+    kept as plain text.
+    """
+    match = role_target_pattern.match(text)
+    label, target = (match.group(1), match.group(2)) if match else (text, None)
+    settings = inliner.document.settings
+    xref = getattr(settings, 'rst2md_xref', None)
+    if xref is None:
+        return [nodes.Text(label)], []
+    label, link = xref.resolve_role(name, label, target, getattr(settings, 'rst2md_document', None))
+    if link is None:
+        return [nodes.Text(label)], []
+    return [nodes.reference(rawtext, label, refuri=link)], []
+
+
+def xref_inliner():
+    """Return an inline parser that handles :ref: and :doc: with xref_role.
+
+    The roles are looked up here rather than registered with docutils, so
+    only the writer's own parses see them and other docutils users in the
+    process, such as SimpleRSTAnalyzer, are unaffected. The lookup is set
+    on the instance because docutils builds an Inliner's patterns from the
+    attributes of its class, which a subclass doesn't carry.
+    """
+    inliner = states.Inliner()
+    interpreted = inliner.interpreted
+
+    def lookup(rawsource, text, role, lineno):
+        if role.lower() in XREF_ROLES:
+            return xref_role(role.lower(), rawsource, text, lineno, inliner)
+        return interpreted(rawsource, text, role, lineno)
+
+    inliner.interpreted = lookup
+    return inliner
+
+
+def parse_rst(content, xref=None, document=None):
+    """Parse RST source into a docutils doctree.
+
+    xref is an optional rst_xref.XrefIndex for :ref: and :doc: roles, and
+    document the path of the source file they are relative to.
+    """
+    return publish_doctree(content, parser=Parser(inliner=xref_inliner()),
+                           settings_overrides={'rst2md_xref': xref, 'rst2md_document': document})
+
+
+class MarkdownTranslator(nodes.NodeVisitor):
+    """Write Markdown for a docutils doctree.
+
+    Block-level output is collected as a list of Markdown blocks per
+    container; containers that need a prefix (admonitions, block quotes,
+    list items) push a new list on visit and fold it into their parent on
+    departure. Inline text is gathered into the current paragraph.
+    """
+
+    def __init__(self, document, converter):
+        super().__init__(document)
+        self.converter = converter
+        self.blocks = [[]]
+        self.inline = None
+        self.section_level = 1 if document.get('title') else 0
+        self.quote_depth = 0
+        self.admonition_titles = []
+        self.tables = []
+
+    def astext(self):
+        """Return the Markdown written for the document."""
+        markdown = '\n\n'.join(block for block in self.blocks[0] if block)
+        return markdown + '\n' if markdown else markdown
+
+    # Helpers
+
+    def _add_block(self, markdown):
+        """Append a finished Markdown block to the current container."""
+        self.blocks[-1].append(markdown)
+
+    def _push(self):
+        """Start collecting the blocks of a nested container."""
+        self.blocks.append([])
+
+    def _pop(self):
+        """Finish a nested container and return its Markdown."""
+        return '\n\n'.join(block for block in self.blocks.pop() if block)
+
+    def _start_inline(self):
+        self.inline = []
+
+    def _end_inline(self):
+        text = ''.join(self.inline)
+        self.inline = None
+        return text
+
+    def _add_text(self, text):
+        """Add inline text, or a block of its own when outside a paragraph."""
+        if self.inline is not None:
+            self.inline.append(text)
+        elif text.strip():
+            self._add_block(text)
+
+    # Fallbacks: unknown containers are transparent, unknown text elements become paragraphs
+
+    def unknown_visit(self, node):
+        if isinstance(node, nodes.TextElement) and self.inline is None:
+            self._start_inline()
+            node['md_paragraph'] = True
+
+    def unknown_departure(self, node):
+        if node.get('md_paragraph'):
+            del node['md_paragraph']
+            self._add_block(self._end_inline())
+
+    def dispatch_visit(self, node):
+        if isinstance(node, SKIPPED_NODES):
+            raise nodes.SkipNode
+        if isinstance(node, nodes.Admonition):
+            return self.visit_Admonition(node)
+        return super().dispatch_visit(node)
+
+    def dispatch_departure(self, node):
+        if isinstance(node, nodes.Admonition):
+            return self.depart_Admonition(node)
+        return super().dispatch_departure(node)
+
+    # Document structure
+
+    def visit_document(self, node):
+        pass
+
+    def depart_document(self, node):
+        pass
+
+    def visit_section(self, node):
+        self.section_level += 1
+
+    def depart_section(self, node):
+        self.section_level -= 1
+
+    def visit_title(self, node):
+        self._start_inline()
+
+    def depart_title(self, node):
+        title = self._end_inline()
+        if isinstance(node.parent, nodes.Admonition):
+            self.admonition_titles[-1] = title
+        elif isinstance(node.parent, (nodes.section, nodes.document)):
+            level = max(1, self.section_level)
+            self._add_block(f"{'#' * level} {title}")
+        else:
+            self._add_block(f"**{title}**")
+
+    def visit_subtitle(self, node):
+        self._start_inline()
+
+    def depart_subtitle(self, node):
+        self._add_block(f"## {self._end_inline()}")
+
+    def visit_paragraph(self, node):
+        self._start_inline()
+
+    def depart_paragraph(self, node):
+        self._add_block(self._end_inline())
+
+    def visit_transition(self, node):
+        self._add_block('---')
+        raise nodes.SkipNode
+
+    # Inline markup
+
+    def visit_Text(self, node):
+        self._add_text(node.astext())
+
+    def depart_Text(self, node):
+        pass
+
+    def visit_emphasis(self, node):
+        self._add_text('*')
+
+    def depart_emphasis(self, node):
+        self._add_text('*')
+
+    def visit_strong(self, node):
+        self._add_text('**')
+
+    def depart_strong(self, node):
+        self._add_text('**')
+
+    def visit_literal(self, node):
+        self._add_text(f"`{node.astext()}`")
+        raise nodes.SkipNode
+
+    def visit_title_reference(self, node):
+        self._add_text(f"`{node.astext()}`")
+        raise nodes.SkipNode
+
+    def visit_reference(self, node):
+        uri = node.get('refuri')
+        if uri is None and node.get('refid'):
+            uri = '#' + node['refid']
+        text = node.astext()
+        if uri is None or uri == text:
+            # Bare URLs and unresolved references stay as plain text
+            self._add_text(text)
+            raise nodes.SkipNode
+        self._add_text('[')
+
+    def depart_reference(self, node):
+        uri = node.get('refuri') or '#' + node['refid']
+        self._add_text(f"]({uri})")
+
+    # Block directives
+
+    def visit_Admonition(self, node):
+        name = node.tagname
+        self.admonition_titles.append("Info" if name == 'admonition' else name.capitalize())
+        self.quote_depth += 1
+        self._push()
+
+    def depart_Admonition(self, node):
+        body = self._pop()
+        self.quote_depth -= 1
+        title = self.admonition_titles.pop()
+        self._add_block(f"> **{title}**\n> \n{self.converter._format_blockquote_content(body)}")
+
+    def visit_block_quote(self, node):
+        self.quote_depth += 1
+        self._push()
+
+    def depart_block_quote(self, node):
+        body = self._pop()
+        self.quote_depth -= 1
+        self._add_block(self.converter._format_blockquote_content(body))
+
+    def visit_raw(self, node):
+        if 'html' not in node.get('format', '').split():
+            raise nodes.SkipNode
+        html_content = node.astext().strip()
+        if re.match(r'^\s*<pre>', html_content):
+            pre_content = re.sub(r'^\s*<pre>(.*?)</pre>\s*$', r'\1', html_content, flags=re.DOTALL).strip()
+            # Inside admonitions the content is kept as plain text
+            self._add_block(pre_content if self.quote_depth else f"```\n{pre_content}\n```")
+        else:
+            self._add_block(html_content)
+        raise nodes.SkipNode
+
+    def visit_literal_block(self, node):
+        classes = [c for c in node.get('classes', []) if c != 'code']
+        language = classes[0] if classes else ''
+        self._add_block(f"```{language}\n{node.astext()}\n```")
+        raise nodes.SkipNode
+
+    def visit_image(self, node):
+        uri = node['uri']
+        alt_text = node.get('alt', '')
+        width = node.get('width', '')
+        align = node.get('align', '')
+        css_class = ' '.join(node.get('classes', []))
+        if width or align or css_class:
+            image = self.converter._format_image_html(uri, alt_text, width, align, css_class)
+        else:
+            image = f"![{alt_text}]({uri})"
+        self._add_text(image)
+        raise nodes.SkipNode
+
+    # Tables
+
+    def visit_table(self, node):
+        self.tables.append({'rows': [], 'header_rows': 0, 'columns': 0, 'in_head': False})
+
+    def depart_table(self, node):
+        table = self.tables.pop()
+        self._add_block(render_table(table['rows'], table['header_rows'], table['columns']))
+
+    def visit_tgroup(self, node):
+        self.tables[-1]['columns'] = node['cols']
+
+    def depart_tgroup(self, node):
+        pass
+
+    def visit_colspec(self, node):
+        raise nodes.SkipNode
+
+    def visit_thead(self, node):
+        self.tables[-1]['in_head'] = True
+
+    def depart_thead(self, node):
+        self.tables[-1]['in_head'] = False
+
+    def visit_tbody(self, node):
+        pass
+
+    def depart_tbody(self, node):
+        pass
+
+    def visit_row(self, node):
+        table = self.tables[-1]
+        table['rows'].append([])
+        if table['in_head']:
+            table['header_rows'] += 1
+
+    def depart_row(self, node):
+        pass
+
+    def visit_entry(self, node):
+        self._push()
+
+    def depart_entry(self, node):
+        text = self._pop().replace('\n', ' ')
+        self.tables[-1]['rows'][-1].append({'lines': [text] if text else [],
+                                            'colspan': node.get('morecols', 0) + 1,
+                                            'rowspan': node.get('morerows', 0) + 1})
+
+    # Lists
+
+    def visit_bullet_list(self, node):
+        self._push()
+
+    def depart_bullet_list(self, node):
+        self._depart_list(node)
+
+    def visit_enumerated_list(self, node):
+        self._push()
+
+    def depart_enumerated_list(self, node):
+        self._depart_list(node)
+
+    def _depart_list(self, node):
+        items = self.blocks.pop()
+        loose = any('\n\n' in item for item in items)
+        self._add_block(('\n\n' if loose else '\n').join(items))
+
+    def visit_list_item(self, node):
+        self._push()
+
+    def depart_list_item(self, node):
+        body = self._pop().split('\n')
+        parent = node.parent
+        if isinstance(parent, nodes.enumerated_list):
+            marker = f"{parent.get('start', 1) + parent.index(node)}."
+        else:
+            marker = parent.get('bullet', '*')
+        indent = ' ' * (len(marker) + 1)
+        rendered = [f"{marker} {body[0]}"]
+        rendered.extend(f"{indent}{line}" if line else '' for line in body[1:])
+        self._add_block('\n'.join(rendered))
+
+
+def doctree_to_markdown(doctree, converter):
+    """Write Markdown for a parsed doctree using the converter's formatting helpers."""
+    translator = MarkdownTranslator(doctree, converter)
+    doctree.walkabout(translator)
+    return translator.astext()
+
+
+def compare_backends(rst_file, repeat=20):
+    """Time each conversion engine on one file and return documents per second."""
+    from rst_analyzer import SimpleRSTAnalyzer
+    from rst_to_md_converter_updated import ENGINES, RSTToMarkdownConverter
+
+    with open(rst_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    results = {}
+    for engine in ENGINES:
+        converter = RSTToMarkdownConverter(engine=engine)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            converter.convert_content(content)
+        results[engine] = repeat / (time.perf_counter() - start)
+
+    # Analyze and convert from one parse versus parsing once for each
+    converter = RSTToMarkdownConverter(engine='docutils')
+    start = time.perf_counter()
+    for _ in range(repeat):
+        doctree = parse_rst(content)
+        converter.convert_doctree(doctree)
+        SimpleRSTAnalyzer().analyze_content(content, doctree=doctree)
+    results['docutils+analyze (one parse)'] = repeat / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        converter.convert_content(content)
+        SimpleRSTAnalyzer().analyze_content(content)
+    results['docutils+analyze (two parses)'] = repeat / (time.perf_counter() - start)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare conversion engine throughput on an RST file.')
+    parser.add_argument('rst_file', nargs='?', default='integrations.rst',
+                        help='RST file to convert (default: integrations.rst)')
+    parser.add_argument('--repeat', type=int, default=20, help='Conversions per engine (default: 20)')
+    args = parser.parse_args()
+
+    for name, rate in compare_backends(args.rst_file, args.repeat).items():
+        print(f"{name:32} {rate:10.1f} docs/s")
@@ -0,0 +1,243 @@
+"""
+Declarative fix-up rules for converted Markdown.
+Rules are loaded from a JSON (or YAML) file instead of being hard-coded in
+the converter. Each rule applies to one kind of block: blockquotes, fenced
+code or plain text, or to the whole document before it is split. The rules for a block type are compiled into a single
+alternation, so each block is scanned once no matter how many rules there
+are, and every rule counts how often it fires so dead ones can be pruned.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from bisect import bisect_right
+from collections import Counter
+
+from rst_common import FenceTracker
+
+# Rules shipped with the converter, used when no other file is given
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixup_rules.json')
+
+# Block types a rule can be scoped to
+BLOCK_SCOPES = ('blockquote', 'code', 'text')
+
+# 'any' matches every block type; 'document' rules see the whole text, across block boundaries
+SCOPES = BLOCK_SCOPES + ('any', 'document')
+
+FLAGS = {'IGNORECASE': 'i', 'MULTILINE': 'm', 'DOTALL': 's', 'VERBOSE': 'x'}
+
+backreference_pattern = re.compile(r'\\[1-9]|\(\?P=|\(\?P<')
+
+
+def split_blocks(text):
+    """Split Markdown into (scope, text) blocks whose concatenation is the input.
+
+    Consecutive lines starting with > form a blockquote block, fences
+    included; an unquoted fence runs to its closing fence as a code block;
+    everything else is text. Each block keeps its line endings.
+    """
+    blocks = []
+    scope = None
+    lines = []
+    fence = FenceTracker()
+
+    for line in text.splitlines(keepends=True):
+        if fence.open:
+            lines.append(line)
+            fence.feed(line)
+            if not fence.open:
+                blocks.append(('code', ''.join(lines)))
+                lines = []
+                scope = None
+            continue
+
+        if line.startswith('>'):
+            line_scope = 'blockquote'
+        elif fence.feed(line):
+            line_scope = 'code'
+        else:
+            line_scope = 'text'
+        if line_scope != scope and lines:
+            blocks.append((scope, ''.join(lines)))
+            lines = []
+        scope = line_scope
+        lines.append(line)
+
+    if lines:
+        blocks.append((scope, ''.join(lines)))
+    return blocks
+
+
+class Rule:
+    """One substitution, optionally limited to matches that follow a marker in the same block."""
+
+    def __init__(self, name, pattern, replace, scope='any', flags=(), after=None):
+        if scope not in SCOPES:
+            raise ValueError(f"Rule {name!r}: unknown scope {scope!r}, expected one of {', '.join(SCOPES)}")
+        if backreference_pattern.search(pattern):
+            # Group numbers and names are shared once the rules are combined
+            raise ValueError(f"Rule {name!r}: patterns cannot use backreferences or named groups")
+        unknown = [flag for flag in flags if flag not in FLAGS]
+        if unknown:
+            raise ValueError(f"Rule {name!r}: unknown flags {', '.join(unknown)}")
+        self.name = name
+        self.scope = scope
+        self.replace = replace
+        self.inline_flags = ''.join(FLAGS[flag] for flag in flags)
+        self.source = f"(?{self.inline_flags}:{pattern})" if self.inline_flags else pattern
+        try:
+            self.regex = re.compile(self.source)
+            self.after = re.compile(after) if after else None
+        except re.error as e:
+            raise ValueError(f"Rule {name!r}: {e}") from None
+
+    def expand(self, match):
+        """Return the replacement for a match of this rule."""
+        return match.expand(self.replace)
+
+
+class RuleSet:
+    """An ordered list of rules, compiled into one pattern per block type.
+
+    Where several rules match at the same position the first one listed
+    wins, and matches never overlap. Hit counts are kept per rule and are
+    safe to update from several threads.
+    """
+
+    def __init__(self, rules, source=None):
+        self.rules = list(rules)
+        self.source = source
+        names = [rule.name for rule in self.rules]
+        duplicates = sorted(name for name, count in Counter(names).items() if count > 1)
+        if duplicates:
+            raise ValueError(f"Duplicate rule names: {', '.join(duplicates)}")
+        self.hits = Counter({name: 0 for name in names})
+        self._lock = threading.Lock()
+        self.digest = hashlib.sha256(json.dumps(
+            [[rule.name, rule.source, rule.replace, rule.scope, rule.after and rule.after.pattern]
+             for rule in self.rules]).encode('utf-8')).hexdigest()[:16]
+
+        # Per block type: the rules that apply and their combined pattern
+        self._compiled = {}
+        for scope in BLOCK_SCOPES:
+            applicable = [rule for rule in self.rules if rule.scope in (scope, 'any')]
+            if applicable:
+                self._compiled[scope] = self._combine(applicable)
+        # Document rules each make their own pass, in order, so a rule sees what earlier ones left
+        self._document = [self._combine([rule]) for rule in self.rules if rule.scope == 'document']
+
+    @staticmethod
+    def _combine(rules):
+        return rules, re.compile('|'.join(f"(?P<r{i}>{rule.source})" for i, rule in enumerate(rules)))
+
+    @classmethod
+    def load(cls, path):
+        """Load rules from a JSON file, or a YAML file if PyYAML is installed.
+
+        The file holds {"rules": [...]}, each rule having a name, a pattern
+        and a replace string, and optionally a scope, a list of flags and an
+        after pattern that must occur earlier in the same block.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith(('.yaml', '.yml')):
+                # PyYAML is only needed for YAML rule files
+                import yaml
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        rules = []
+        for entry in data.get('rules', []):
+            rules.append(Rule(entry['name'], entry['pattern'], entry.get('replace', ''),
+                              entry.get('scope', 'any'), entry.get('flags', ()), entry.get('after')))
+        return cls(rules, path)
+
+    def _apply_block(self, compiled, text, hits):
+        if compiled is None:
+            return text
+        applicable, combined = compiled
+        # Marker positions per rule, found the first time a rule needs them
+        markers = {}
+        # End of each rule's last substitution, so one marker allows one substitution
+        last = {}
+        parts = []
+        position = 0
+        search_from = 0
+
+        while search_from <= len(text):
+            candidate = combined.search(text, search_from)
+            if candidate is None:
+                break
+            start = candidate.start()
+            first = int(candidate.lastgroup[1:])
+            found = None
+            # The combined pattern only says which rule matches first here; matching that
+            # rule again on its own gives the groups its replacement refers to
+            for i in range(first, len(applicable)):
+                rule = applicable[i]
+                match = rule.regex.match(text, start)
+                if match is None:
+                    continue
+                if rule.after is not None:
+                    if i not in markers:
+                        markers[i] = [m.end() for m in rule.after.finditer(text)]
+                    ends = markers[i]
+                    # A marker must end before the match and after this rule's previous substitution
+                    k = bisect_right(ends, start)
+                    if k == 0 or ends[k - 1] <= last.get(i, -1):
+                        continue
+                found = rule, match, i
+                break
+
+            if found is None:
+                search_from = start + 1
+                continue
+            rule, match, i = found
+            end = match.end()
+            parts.append(text[position:start])
+            parts.append(rule.expand(match))
+            hits[rule.name] += 1
+            last[i] = end
+            position = end
+            search_from = end if end > start else end + 1
+
+        if not parts:
+            return text
+        parts.append(text[position:])
+        return ''.join(parts)
+
+    def apply(self, text):
+        """Apply every rule to the blocks it is scoped to and return (text, hits).
+
+        Document rules run first, one pass each over the whole text; the
+        result is then split into blocks for the others. hits counts the substitutions each rule made in this text; the
+        totals across calls are kept in self.hits.
+        """
+        hits = Counter()
+        for compiled in self._document:
+            text = self._apply_block(compiled, text, hits)
+        result = ''.join(self._apply_block(self._compiled.get(scope), block, hits)
+                         for scope, block in split_blocks(text))
+        if hits:
+            with self._lock:
+                self.hits.update(hits)
+        return result, hits
+
+    def unused(self):
+        """Return the names of rules that have never fired."""
+        with self._lock:
+            return [rule.name for rule in self.rules if not self.hits[rule.name]]
+
+
+_default_rules = None
+_default_lock = threading.Lock()
+
+
+def default_rules():
+    """Return the RuleSet loaded from DEFAULT_RULES_PATH, loading it once per process."""
+    global _default_rules
+    with _default_lock:
+        if _default_rules is None:
+            _default_rules = RuleSet.load(DEFAULT_RULES_PATH)
+        return _default_rules
@@ -0,0 +1,252 @@
+"""
+Grid and simple table support for the RST converter.
+Column boundaries are computed once from a table's border line and every
+row is parsed in a single pass, so conversion time is proportional to the
+size of the table. Tables without spans become Markdown pipe tables; tables
+with row or column spans fall back to HTML.
+"""
+
+import html
+import re
+
+grid_border_pattern = re.compile(r'^\+(?:[-=]+\+)+\s*$')
+simple_border_pattern = re.compile(r'^=+(?: +=+)+\s*$')
+simple_span_pattern = re.compile(r'^-[- ]*$')
+rule_pattern = re.compile(r'^[-=]+$')
+
+
+def is_grid_border(line):
+    """Return True if the line is a grid table border such as +----+----+."""
+    return grid_border_pattern.match(line) is not None
+
+
+def is_simple_border(line):
+    """Return True if the line is a simple table border with at least two columns."""
+    return simple_border_pattern.match(line) is not None
+
+
+def _cell(lines, colspan=1):
+    return {'lines': lines, 'colspan': colspan, 'rowspan': 1}
+
+
+def parse_grid_table(lines):
+    """Parse a grid table into (rows, header_rows, column_count).
+
+    Column boundaries come from the top border. Each line is then scanned
+    once: a segment made only of - or = closes the cell above it, anything
+    else adds a line of text to the cell open in that column. A missing |
+    between two columns makes the cell span both.
+    """
+    border = lines[0].rstrip()
+    bounds = [i for i, char in enumerate(border) if char == '+']
+    columns = len(bounds) - 1
+
+    rows = []
+    active = [None] * columns
+    band = 0
+    header_rows = 0
+
+    for line in lines[1:]:
+        line = line.rstrip().ljust(bounds[-1] + 1)
+        rule = False
+        j = 0
+        while j < columns:
+            segment = line[bounds[j] + 1:bounds[j + 1]]
+            if rule_pattern.match(segment):
+                # Close the cell above this segment
+                cell = active[j]
+                if cell is not None:
+                    cell['rowspan'] = band + 1 - cell['band']
+                    for k in range(j, j + cell['colspan']):
+                        active[k] = None
+                    j += cell['colspan']
+                else:
+                    j += 1
+                rule = True
+                if '=' in segment:
+                    header_rows = band + 1
+                continue
+
+            # Text continues across boundaries that aren't drawn on this line
+            end = j + 1
+            while end < columns and line[bounds[end]] not in '|+':
+                end += 1
+            cell = active[j]
+            if cell is None:
+                cell = _cell([], end - j)
+                cell['band'] = band
+                while len(rows) <= band:
+                    rows.append([])
+                rows[band].append(cell)
+                for k in range(j, end):
+                    active[k] = cell
+            cell['lines'].append(line[bounds[j] + 1:bounds[j + cell['colspan']]].strip())
+            j += cell['colspan']
+        if rule:
+            band += 1
+
+    for row in rows:
+        for cell in row:
+            del cell['band']
+    return rows, header_rows, columns
+
+
+def parse_simple_table(lines):
+    """Parse a simple table into (rows, header_rows, column_count).
+
+    Column ranges come from the top border. A row whose first column is
+    blank continues the row above it, and a line of dashes under a row
+    joins the columns it spans.
+    """
+    border = lines[0].rstrip()
+    ranges = [(m.start(), m.end()) for m in re.finditer(r'=+', border)]
+    columns = len(ranges)
+    starts = [start for start, end in ranges]
+
+    def split(line):
+        texts = []
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < columns else None
+            texts.append(line[start:end].strip())
+        return texts
+
+    rows = []
+    header_rows = 0
+    last_border = len(lines) - 1
+    for index, line in enumerate(lines[1:], 1):
+        if not line.strip():
+            continue
+        if is_simple_border(line):
+            if index != last_border:
+                header_rows = len(rows)
+            continue
+        if simple_span_pattern.match(line.rstrip()) and rows:
+            # Merge the cells of the row above under each run of dashes
+            merged = []
+            cells = rows[-1]
+            for m in re.finditer(r'-+', line):
+                covered = [i for i, start in enumerate(starts) if m.start() <= start < m.end()]
+                if not covered:
+                    continue
+                texts = [' '.join(cells[i]['lines']) for i in covered if cells[i]['lines']]
+                merged.append(_cell([' '.join(texts)] if texts else [], len(covered)))
+            rows[-1] = merged
+            continue
+        texts = split(line)
+        if rows and not texts[0] and len(rows[-1]) == columns:
+            # Continuation line of the previous row
+            for cell, text in zip(rows[-1], texts):
+                if text:
+                    cell['lines'].append(text)
+            continue
+        rows.append([_cell([text] if text else []) for text in texts])
+    return rows, header_rows, columns
+
+
+def _text(cell, inline):
+    return inline(' '.join(line for line in cell['lines'] if line))
+
+
+def render_table(rows, header_rows, columns, inline=None):
+    """Render parsed rows as a Markdown pipe table, or as HTML if any cell spans."""
+    inline = inline or (lambda text: text)
+    spans = any(cell['colspan'] > 1 or cell['rowspan'] > 1 for row in rows for cell in row)
+    if spans:
+        return render_html_table(rows, header_rows, inline)
+
+    def pipe_row(cells):
+        texts = [_text(cell, inline).replace('|', '\\|') for cell in cells]
+        texts += [''] * (columns - len(texts))
+        return '| ' + ' | '.join(texts) + ' |'
+
+    if header_rows:
+        # Markdown allows one header row, so stacked header rows are joined per column
+        header = [_cell([_text(row[i], inline) for row in rows[:header_rows] if i < len(row)])
+                  for i in range(columns)]
+        body = rows[header_rows:]
+    else:
+        header = [_cell([]) for _ in range(columns)]
+        body = rows
+
+    lines = [pipe_row(header), '| ' + ' | '.join(['---'] * columns) + ' |']
+    lines.extend(pipe_row(row) for row in body)
+    return '\n'.join(lines)
+
+
+def render_html_table(rows, header_rows, inline=None):
+    """Render parsed rows as an HTML table with rowspan and colspan attributes."""
+    inline = inline or (lambda text: text)
+    lines = ['<table>']
+    for index, row in enumerate(rows):
+        tag = 'th' if index < header_rows else 'td'
+        cells = []
+        for cell in row:
+            attrs = ''
+            if cell['colspan'] > 1:
+                attrs += f' colspan="{cell["colspan"]}"'
+            if cell['rowspan'] > 1:
+                attrs += f' rowspan="{cell["rowspan"]}"'
+            cells.append(f"<{tag}{attrs}>{html.escape(_text(cell, inline), quote=False)}</{tag}>")
+        lines.append('<tr>' + ''.join(cells) + '</tr>')
+    lines.append('</table>')
+    return '\n'.join(lines)
+
+
+def convert_table(lines, inline=None):
+    """Convert the lines of a grid or simple table (without indentation) to Markdown."""
+    if is_grid_border(lines[0]):
+        rows, header_rows, columns = parse_grid_table(lines)
+    else:
+        rows, header_rows, columns = parse_simple_table(lines)
+    return render_table(rows, header_rows, columns, inline)
+
+
+def table_extent(peek):
+    """Return the number of lines in a table starting at peek(0), or None if it isn't one.
+
+    peek(n) returns the nth line from the start, or None past the end of the
+    input. Lines are compared after removing the indentation of the first
+    line. As docutils reads them, a grid table runs to the last border in
+    the lines starting with + or |, and a simple table to the border that
+    is followed by a blank line or the end of input, or to its third border.
+    A scan that finds no table therefore never passes more than two borders,
+    so scanning from every border in a document stays linear in its length.
+    """
+    first = peek(0)
+    indent = len(first) - len(first.lstrip())
+    prefix = first[:indent]
+
+    def body(n):
+        line = peek(n)
+        return line[indent:] if line is not None and line.startswith(prefix) else None
+
+    if is_grid_border(first[indent:]):
+        count = 1
+        last_border = 0
+        while True:
+            text = body(count)
+            if text is None or text[:1] not in ('+', '|'):
+                break
+            if is_grid_border(text):
+                last_border = count
+            count += 1
+        # Like docutils, a run that doesn't end on a border ends the table at its last border
+        return last_border + 1 if last_border > 1 else None
+
+    if is_simple_border(first[indent:]):
+        count = 1
+        borders = 1
+        while True:
+            line = peek(count)
+            if line is None:
+                return None
+            text = body(count)
+            if text is None and line.strip():
+                return None
+            if text is not None and count > 1 and is_simple_border(text):
+                borders += 1
+                following = peek(count + 1)
+                if borders == 3 or following is None or not following.strip():
+                    return count + 1
+            count += 1
+    return None
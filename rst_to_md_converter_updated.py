@@ -8,71 +8,602 @@ raw HTML blocks, and custom directives.
 import re
 import os
 import sys
-from docutils.core import publish_doctree
-from docutils import nodes
+import json
+import time
+import argparse
+import threading
+from bisect import bisect_right
+
+from rst_block_lexer import section_starts, tokenize_blocks
+from rst_common import atomic_open, atomic_write, quote_prefix_pattern
+from rst_includes import IncludeResolver, has_includes
+from rst_rules import RuleSet, default_rules
+from rst_tables import convert_table, table_extent
+
+# Bump whenever a change alters converted output, so incremental builds redo every file
+CONVERTER_VERSION = '1.8'
+
+# Conversion engines: the stage-by-stage regex pipeline, the single-pass block lexer
+# and a docutils doctree writer
+ENGINES = ('regex', 'lexer', 'docutils')
+
+# Stages of the regex pipeline, in the order convert_content runs them
+STAGES = ('convert_tables', 'convert_section_headers', 'convert_admonitions', 'convert_raw_html',
+          'convert_references', 'convert_links', 'convert_images', 'convert_inline_image_attributes',
+          'convert_code_blocks', 'clean_up')
+
+# Body of a directive: everything up to a newline that is followed by unindented text,
+# two blank lines or the end of the input. Written as a greedy loop that can only stop
+# there, which matches what (.*?)(?=\n\S|\n\n\n|\n\.\.|$) did but never rescans
+DIRECTIVE_BODY = r'((?:[^\n]+|\n(?!\S|\n\n|\Z))*)'
+
+# Lines a line-by-line stage handles between checks of the time budget
+BUDGET_CHECK_LINES = 256
+
+# Directives rendered as Markdown blockquotes
+ADMONITIONS = ('note', 'warning', 'admonition', 'attention', 'caution', 'danger',
+               'error', 'hint', 'important', 'tip')
+
+# Characters docsify drops when it turns a heading into an anchor
+SLUG_PUNCTUATION = re.compile(r'[\u2000-\u206F\u2E00-\u2E7F\\\'!"#$%&()*+,./:;<=>?@\[\]^`{|}~]')
+
+def slugify(text):
+    """Return the anchor docsify generates for a heading, before any duplicate suffix."""
+    slug = re.sub(r'[A-Z]+', lambda m: m.group(0).lower(), text.strip())
+    slug = re.sub(r'<[^>]+>', '', slug)
+    slug = SLUG_PUNCTUATION.sub('', slug)
+    slug = re.sub(r'\s', '-', slug)
+    slug = re.sub(r'-+', '-', slug)
+    return re.sub(r'^(\d)', r'_\1', slug)
+
+class LineIndex:
+    """Line offsets and indentation of a document, built once per document.
+    
+    Lets handlers map a match offset to its line and nesting context without
+    re-splitting the text that precedes it.
+    """
+    
+    def __init__(self, content):
+        self.line_starts = [0]
+        self.indents = []
+        offset = 0
+        for line in content.split('\n'):
+            self.indents.append(len(line) - len(line.lstrip(' ')))
+            offset += len(line) + 1
+            self.line_starts.append(offset)
+        self.line_starts.pop()
+    
+    def line_of(self, offset):
+        """Return the zero-based line number containing offset."""
+        return bisect_right(self.line_starts, offset) - 1
+    
+    def column_of(self, offset):
+        """Return the zero-based column of offset within its line."""
+        return offset - self.line_starts[self.line_of(offset)]
+    
+    def indent_of(self, line):
+        """Return the number of leading spaces on a line."""
+        return self.indents[line]
+    
+    def in_indented_context(self, offset, lookback=5, width=3):
+        """Return True if offset sits in or just after text indented by at least width spaces.
+        
+        Checks the text before offset on its own line plus the lookback - 1
+        lines above it, which is how nested directive bodies are recognised.
+        """
+        line = self.line_of(offset)
+        if min(self.indents[line], offset - self.line_starts[line]) >= width:
+            return True
+        return any(self.indents[n] >= width for n in range(max(0, line - lookback + 1), line))
+
+class StageProfiler:
+    """Collects wall time, match counts and size changes for each conversion stage.
+    
+    Pass one to convert_content(profiler=...). Sub-steps of a stage are
+    recorded after it with a greater depth. If a callback is given it is
+    called with each record as the stage finishes.
+    """
+    
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.records = []
+        self._open = []
+    
+    def begin(self, stage):
+        """Open a record for a stage; nested stages are named parent.stage."""
+        if self._open:
+            stage = f"{self._open[-1]['stage']}.{stage}"
+        record = {'stage': stage, 'depth': len(self._open), 'seconds': 0.0, 'matches': 0,
+                  'size_before': 0, 'size_after': 0, 'size_delta': 0}
+        self.records.append(record)
+        self._open.append(record)
+    
+    def add_matches(self, count):
+        """Count matches or substitutions against every open stage."""
+        for record in self._open:
+            record['matches'] += count
+    
+    def end(self, seconds, size_before, size_after):
+        """Close the innermost open stage."""
+        record = self._open.pop()
+        record['seconds'] = seconds
+        record['size_before'] = size_before
+        record['size_after'] = size_after
+        record['size_delta'] = size_after - size_before
+        if self.callback is not None:
+            self.callback(record)
+    
+    def format_table(self):
+        """Return the records as a plain-text table."""
+        total = sum(r['seconds'] for r in self.records if r['depth'] == 0) or 1.0
+        lines = [f"{'stage':55} {'seconds':>10} {'%':>6} {'matches':>8} {'size delta':>11}"]
+        for r in self.records:
+            name = '  ' * r['depth'] + r['stage']
+            lines.append(f"{name:55} {r['seconds']:10.5f} {100 * r['seconds'] / total:6.1f} "
+                         f"{r['matches']:8d} {r['size_delta']:+11d}")
+        return '\n'.join(lines)
+    
+    def to_json(self):
+        """Return the records as a JSON string."""
+        return json.dumps(self.records, indent=2)
+
+class TimeBudgetExceeded(Exception):
+    """Raised inside the regex pipeline when a document runs past its time budget."""
 
 class RSTToMarkdownConverter:
-    def __init__(self):
+    def __init__(self, engine='regex', includes=None, xref=None, time_budget=None, rules=None, assets=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {', '.join(ENGINES)}")
+        self.engine = engine
+        # Per-thread conversion state, such as the active profiler
+        self._local = threading.local()
+        # Cache of included files, which can be shared between converters
+        self.includes = includes if includes is not None else IncludeResolver()
+        # Optional rst_xref.XrefIndex used to resolve :ref:, :doc: and `label`_ references
+        self.xref = xref
+        # Seconds the regex engine may spend on one document before it is redone with the lexer
+        self.time_budget = time_budget
+        # Documents that ran out of time and were converted with the lexer instead
+        self.fallbacks = []
+        # rst_rules.RuleSet of fix-ups applied by clean_up; defaults to fixup_rules.json
+        self.rules = rules if rules is not None else default_rules()
+        # Optional rst_assets.AssetStore that convert_file places local images in
+        self.assets = assets
+        
         # Regex patterns for RST elements
         self.section_pattern = re.compile(r'^([=~\-`\'":^_*+#])\1{2,}\s*$', re.MULTILINE)
-        self.directive_pattern = re.compile(r'\.\.\s+([a-zA-Z0-9_-]+)::(.*?)(?=\n\S|\n\n\n|\n\.\.|$)', re.DOTALL)
+        self.directive_pattern = re.compile(r'\.\.\s+([a-zA-Z0-9_-]+)::' + DIRECTIVE_BODY)
         self.link_pattern = re.compile(r'`([^`]+)\s+<([^>]+)>`_')
-        self.image_pattern = re.compile(r'\.\.\s+image::\s+(.*?)(?=\n\S|\n\n|\n\.\.|$)', re.DOTALL)
+        self.image_pattern = re.compile(r'\.\.\s+image::\s+((?:[^\n]+|\n(?!\S|\n|\Z))*)')
+        # Option lines such as :alt: left over after conversion
+        self.attribute_pattern = re.compile(r':[a-zA-Z]+:')
+        # A paragraph ending in :: (but not a directive) introduces a literal block
+        self.literal_marker_pattern = re.compile(r'^(?!\s*\.\.\s).*::\s*$')
+        # Directives whose body is code, left alone until convert_code_blocks
+        self.code_directive_pattern = re.compile(r'^\s*\.\.\s+(?:code|code-block|sourcecode)::')
+        
+    def convert_file(self, rst_file, md_file=None, profiler=None, included=None, workers=None):
+        """Convert an RST file to Markdown.
         
-    def convert_file(self, rst_file, md_file=None):
-        """Convert an RST file to Markdown."""
+        included is an optional dict that receives the mtime of every file
+        pulled in by include directives, keyed by path, and of every image
+        placed in the asset store. With workers, the lexer engine converts
+        top-level sections in that many processes (see convert_content_parallel).
+        """
         if md_file is None:
             md_file = os.path.splitext(rst_file)[0] + '.md'
+        
+        if self.engine == 'lexer' and profiler is None and workers is None:
+            # Stream block by block so memory stays bounded by the largest block
+            # Written through a temporary file, so a failure part way leaves any previous output intact
+            with open(rst_file, 'r', encoding='utf-8') as src, atomic_open(md_file) as dst:
+                for chunk in self.convert_stream(src, rst_file, included):
+                    if self.assets is not None:
+                        chunk = self.assets.rewrite(chunk, rst_file, md_file, included)
+                    dst.write(chunk)
+            return md_file
             
         with open(rst_file, 'r', encoding='utf-8') as f:
             content = f.read()
             
         # Convert the content
-        md_content = self.convert_content(content)
+        if workers is not None:
+            md_content = self.convert_content_parallel(content, workers, rst_file, included)
+        else:
+            md_content = self.convert_content(content, profiler=profiler, source_path=rst_file, included=included)
+        if self.assets is not None:
+            md_content = self.assets.rewrite(md_content, rst_file, md_file, included)
         
         # Write the converted content
-        with open(md_file, 'w', encoding='utf-8') as f:
-            f.write(md_content)
+        atomic_write(md_file, md_content)
             
         return md_file
     
-    def convert_content(self, content):
-        """Convert RST content to Markdown."""
+    def convert_content(self, content, profiler=None, source_path=None, included=None):
+        """Convert RST content to Markdown.
+        
+        profiler is an optional StageProfiler that records each stage.
+        Include paths are resolved relative to source_path, or to the current
+        directory when it is not given. included works as in convert_file.
+        """
+        self._local.profiler = profiler
+        self._local.document = source_path
+        try:
+            stack = (os.path.abspath(source_path),) if source_path else ()
+            return self._convert_source(content, source_path, stack, {} if included is None else included)
+        finally:
+            self._local.profiler = None
+            self._local.document = None
+    
+    def _convert_source(self, content, source_path, stack, deps):
+        """Resolve include directives, convert with the selected engine and splice the includes back.
+        
+        stack is the chain of files being included, for cycle detection, and
+        deps collects the mtimes of included files.
+        """
+        slots = {}
+        if has_includes(content):
+            content = self._run_stage('resolve_includes', lambda text: '\n'.join(
+                self.includes.expand(text.split('\n'), source_path, self, stack, slots, deps)), content)
+        return self.includes.restore(self._convert_engine(content), slots)
+    
+    def _convert_engine(self, content):
+        """Convert RST content with the selected engine."""
+        if self.engine == 'lexer':
+            return self._run_stage('convert_content_lexer', self.convert_content_lexer, content)
+        elif self.engine == 'docutils':
+            # docutils is slow to import, so it is only loaded for this engine
+            from rst_md_writer import parse_rst
+            document = getattr(self._local, 'document', None)
+            return self._run_stage('convert_doctree', lambda text: self.convert_doctree(
+                parse_rst(text, self.xref, document)), content)
+        if self.time_budget is None:
+            return self._convert_regex(content)
+        
+        previous = getattr(self._local, 'deadline', None)
+        self._local.deadline = time.perf_counter() + self.time_budget
+        try:
+            return self._convert_regex(content)
+        except TimeBudgetExceeded:
+            # The lexer is linear in the size of the input, so it always finishes
+            document = getattr(self._local, 'document', None) or '<string>'
+            print(f"Warning: {document} exceeded its {self.time_budget:g}s budget with the regex "
+                  f"engine, converting it with the lexer engine instead", file=sys.stderr)
+            self.fallbacks.append(document)
+            self._local.deadline = None
+            return self._run_stage('convert_content_lexer', self.convert_content_lexer, content)
+        finally:
+            self._local.deadline = previous
+    
+    def _convert_regex(self, content):
+        """Convert RST content with the stage-by-stage regex pipeline."""
         # Process the content in stages
         
+        # 0. Handle tables, before any stage can rewrite their border lines
+        content = self._run_stage('convert_tables', self.convert_tables, content)
+        
         # 1. Handle section headers
-        content = self.convert_section_headers(content)
+        content = self._run_stage('convert_section_headers', self.convert_section_headers, content)
         
         # 2. Handle admonitions and notes
-        content = self.convert_admonitions(content)
+        content = self._run_stage('convert_admonitions', self.convert_admonitions, content)
         
         # 3. Handle raw HTML blocks
-        content = self.convert_raw_html(content)
+        content = self._run_stage('convert_raw_html', self.convert_raw_html, content)
         
-        # 4. Handle links
-        content = self.convert_links(content)
+        # 4. Handle internal references, then links
+        content = self._run_stage('convert_references', self.convert_references, content)
+        content = self._run_stage('convert_links', self.convert_links, content)
         
         # 5. Handle images
-        content = self.convert_images(content)
+        content = self._run_stage('convert_images', self.convert_images, content)
         
         # 5b. Handle inline image attributes
-        content = self.convert_inline_image_attributes(content)
+        content = self._run_stage('convert_inline_image_attributes', self.convert_inline_image_attributes, content)
         
         # 6. Handle code blocks
-        content = self.convert_code_blocks(content)
+        content = self._run_stage('convert_code_blocks', self.convert_code_blocks, content)
         
         # 7. Clean up any remaining RST-specific syntax
-        content = self.clean_up(content)
+        content = self._run_stage('clean_up', self.clean_up, content)
         
         return content
     
+    def _check_budget(self):
+        """Raise TimeBudgetExceeded if the current document is past its deadline.
+        
+        Checked before every stage and substitution, and every
+        BUDGET_CHECK_LINES lines inside the stages that loop over lines, so a
+        document overruns its budget by at most one substitution or a few
+        hundred lines.
+        """
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeBudgetExceeded(f"Time budget of {self.time_budget:g}s exceeded")
+    
+    def _run_stage(self, stage, func, content):
+        """Run one stage, recording it if a profiler is active."""
+        self._check_budget()
+        profiler = getattr(self._local, 'profiler', None)
+        if profiler is None:
+            return func(content)
+        profiler.begin(stage)
+        start = time.perf_counter()
+        result = func(content)
+        profiler.end(time.perf_counter() - start, len(content), len(result))
+        return result
+    
+    def _sub(self, step, pattern, repl, content, flags=0):
+        """re.sub that records its time and substitution count when profiling."""
+        self._check_budget()
+        profiler = getattr(self._local, 'profiler', None)
+        if profiler is None:
+            return re.sub(pattern, repl, content, flags=flags)
+        profiler.begin(step)
+        start = time.perf_counter()
+        result, count = re.subn(pattern, repl, content, flags=flags)
+        profiler.add_matches(count)
+        profiler.end(time.perf_counter() - start, len(content), len(result))
+        return result
+    
+    def _count(self, count):
+        """Count conversions made outside of _sub when profiling."""
+        profiler = getattr(self._local, 'profiler', None)
+        if profiler is not None and count:
+            profiler.add_matches(count)
+    
+    def convert_doctree(self, doctree):
+        """Convert an already parsed docutils doctree to Markdown."""
+        from rst_md_writer import doctree_to_markdown
+        return doctree_to_markdown(doctree, self)
+    
+    def convert_content_lexer(self, content):
+        """Convert RST content to Markdown in a single pass over its blocks."""
+        return ''.join(self.convert_stream(content.split('\n')))
+    
+    def convert_content_parallel(self, content, workers=None, source_path=None, included=None):
+        """Convert RST content with the lexer engine, rendering top-level sections in parallel.
+        
+        Includes are resolved first, then the document is split where
+        rst_block_lexer.section_starts finds a top-level title. Lexer blocks
+        carry no state from one to the next, so each group of sections is
+        rendered in a worker process and the results are joined in order,
+        giving exactly the output of serial conversion. Only the lexer
+        engine is supported: the regex pipeline works across the whole
+        document and its output would change at the seams.
+        """
+        if self.engine != 'lexer':
+            raise ValueError("Parallel conversion needs the lexer engine")
+        # Imported here, as multiprocessing adds noticeably to the start of every one-shot run
+        from concurrent.futures import ProcessPoolExecutor
+        workers = workers or os.cpu_count() or 1
+        self._local.document = source_path
+        try:
+            slots = {}
+            stack = (os.path.abspath(source_path),) if source_path else ()
+            deps = {} if included is None else included
+            lines = content.split('\n')
+            if has_includes(content):
+                lines = list(self.includes.expand(lines, source_path, self, stack, slots, deps))
+            starts = section_starts(lines)
+            if workers == 1 or not starts:
+                markdown = self._convert_lines(lines)
+            else:
+                bounds = [0] + starts + [len(lines)]
+                # About four groups of sections per worker, of similar length, to even out the load
+                target = len(lines) / (workers * 4)
+                chunks = []
+                begin = 0
+                for end in bounds[1:]:
+                    if end - begin >= target or end == len(lines):
+                        chunks.append((lines[begin:end], source_path))
+                        begin = end
+                with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_section_worker,
+                                         initargs=(self.xref,)) as executor:
+                    parts = list(executor.map(_convert_section, chunks))
+                markdown = '\n\n'.join(part for part in parts if part)
+            return self.includes.restore(markdown + '\n' if markdown else '', slots)
+        finally:
+            self._local.document = None
+    
+    def convert_stream(self, lines, source_path=None, included=None):
+        """Convert RST to Markdown incrementally.
+        
+        lines can be any iterable of lines, such as an open file. A chunk of
+        Markdown is yielded as soon as each top-level block is complete, so
+        only one block is held in memory at a time. Always uses the lexer engine.
+        """
+        slots = {}
+        stack = (os.path.abspath(source_path),) if source_path else ()
+        lines = self.includes.expand(lines, source_path, self, stack, slots, {} if included is None else included)
+        blocks = self._render_blocks(tokenize_blocks(lines))
+        separator = ''
+        while True:
+            # The document is set only while a chunk is produced, so it is not left
+            # behind when the caller stops early or converts something else in between
+            self._local.document = source_path
+            try:
+                markdown = next(blocks, None)
+                if markdown is not None:
+                    markdown = self.includes.restore(markdown, slots)
+            finally:
+                self._local.document = None
+            if markdown is None:
+                break
+            yield separator + markdown
+            separator = '\n\n'
+        if separator:
+            yield '\n'
+    
+    def _convert_lines(self, lines, quoted=False):
+        """Tokenize lines into blocks and join the rendered Markdown."""
+        return '\n\n'.join(self._render_blocks(tokenize_blocks(lines), quoted))
+    
+    def _render_blocks(self, blocks, quoted=False):
+        """Yield the Markdown for each block that produces output."""
+        for block in blocks:
+            markdown = self._render_block(block, quoted)
+            if markdown:
+                yield markdown
+    
+    def _render_block(self, block, quoted=False):
+        """Render a single lexer block as Markdown.
+        
+        quoted is True inside admonitions, where <pre> blocks are kept as plain text.
+        """
+        block_type = block['type']
+        
+        if block_type == 'header':
+            level = self._get_header_level(block['char'])
+            return f"{'#' * level} {self._convert_inline(block['title'])}"
+        elif block_type == 'paragraph':
+            return self._render_paragraph(block['lines'])
+        elif block_type == 'directive':
+            return self._render_directive(block, quoted)
+        elif block_type == 'list':
+            return self._render_list(block, quoted)
+        elif block_type == 'table':
+            return convert_table(block['lines'], self._convert_inline)
+        elif block_type == 'literal':
+            code = '\n'.join(block['lines'])
+            return f"```\n{code}\n```"
+        elif block_type == 'quote':
+            return self._format_blockquote_content(self._convert_lines(block['lines'], True))
+        elif block_type == 'transition':
+            return '---'
+        
+        # Comments and targets produce no output
+        return ''
+    
+    def _render_paragraph(self, lines):
+        """Render paragraph text, resolving a trailing literal block marker."""
+        text = '\n'.join(lines)
+        if text.endswith('::'):
+            if text.strip() == '::':
+                return ''
+            elif text[-3:-2].isspace():
+                text = text[:-2].rstrip()
+            else:
+                text = text[:-1]
+        return self._convert_inline(text)
+    
+    def _render_list(self, block, quoted):
+        """Render a bullet or enumerated list, indenting item bodies under their marker."""
+        items = []
+        for number, item in enumerate(block['items'], 1):
+            marker = item['marker']
+            if block['ordered']:
+                marker = f"{number}." if marker == '#.' else marker
+            body = self._convert_lines(item['lines'], quoted).split('\n')
+            indent = ' ' * (len(marker) + 1)
+            rendered = [f"{marker} {body[0]}"]
+            rendered.extend(f"{indent}{line}" if line else '' for line in body[1:])
+            items.append('\n'.join(rendered))
+        return ('\n\n' if block['loose'] else '\n').join(items)
+    
+    def _render_directive(self, block, quoted):
+        """Render a directive block as Markdown."""
+        name = block['name']
+        argument = block['argument']
+        options = block['options']
+        lines = block['lines']
+        
+        if name in ADMONITIONS:
+            if name == 'admonition':
+                title = argument or "Info"
+            else:
+                title = name.capitalize()
+                lines = ([argument] if argument else []) + lines
+            body = self._convert_lines(lines, True)
+            return f"> **{title}**\n> \n{self._format_blockquote_content(body)}"
+        
+        elif name == 'raw':
+            if argument.lower() != 'html':
+                return ''
+            html_content = '\n'.join(lines).strip()
+            if re.match(r'^\s*<pre>', html_content):
+                pre_content = re.sub(r'^\s*<pre>(.*?)</pre>\s*$', r'\1', html_content, flags=re.DOTALL).strip()
+                # Inside admonitions the content is kept as plain text
+                return pre_content if quoted else f"```\n{pre_content}\n```"
+            return html_content
+        
+        elif name in ('image', 'figure'):
+            alt_text = options.get('alt', '')
+            width = options.get('width', '')
+            align = options.get('align', '')
+            css_class = options.get('class', '')
+            if width or align or css_class:
+                image = self._format_image_html(argument, alt_text, width, align, css_class)
+            else:
+                image = f"![{alt_text}]({argument})"
+            if name == 'figure' and lines:
+                return f"{image}\n\n{self._convert_lines(lines, quoted)}"
+            return image
+        
+        elif name in ('code', 'code-block', 'sourcecode'):
+            code = '\n'.join(lines)
+            return f"```{argument}\n{code}\n```"
+        
+        # Unknown directives keep their content, as the regex pipeline does
+        return self._convert_lines(lines, quoted)
+    
+    def _convert_inline(self, text):
+        """Convert inline RST markup in a run of text."""
+        if self.xref is not None:
+            text = self.xref.rewrite(text, getattr(self._local, 'document', None))
+        return self.link_pattern.sub(r'[\1](\2)', text)
+    
+    def convert_tables(self, content):
+        """Convert grid and simple tables to Markdown pipe tables, or HTML when cells span."""
+        lines = content.split('\n')
+        result = []
+        tables = 0
+        # Indentation of the line that opened the current literal block, if any
+        literal_indent = None
+        
+        i = 0
+        next_check = 0
+        while i < len(lines):
+            if i >= next_check:
+                self._check_budget()
+                next_check = i + BUDGET_CHECK_LINES
+            line = lines[i]
+            stripped = line.lstrip()
+            indent = len(line) - len(stripped)
+            if literal_indent is not None and stripped and indent <= literal_indent:
+                literal_indent = None
+            
+            # Tables start after a blank line, and never inside literal blocks
+            if (literal_indent is None and stripped[:1] in ('+', '=')
+                    and (i == 0 or not lines[i - 1].strip())):
+                count = table_extent(lambda n: lines[i + n] if i + n < len(lines) else None)
+                if count is not None:
+                    table = convert_table([row[indent:] for row in lines[i:i + count]], self._convert_inline)
+                    result.extend(line[:indent] + row for row in table.split('\n'))
+                    tables += 1
+                    i += count
+                    continue
+            
+            if literal_indent is None and self.literal_marker_pattern.match(line):
+                literal_indent = indent
+            result.append(line)
+            i += 1
+        
+        self._count(tables)
+        return '\n'.join(result)
+    
     def convert_section_headers(self, content):
         """Convert RST section headers to Markdown headers."""
         lines = content.split('\n')
         result = []
+        headers = 0
         
         i = 0
+        next_check = 0
         while i < len(lines):
+            if i >= next_check:
+                self._check_budget()
+                next_check = i + BUDGET_CHECK_LINES
             # Check if the current line is a potential header
             if i + 1 < len(lines) and self.section_pattern.match(lines[i + 1]):
                 # This is a header, determine the level
@@ -81,11 +612,13 @@ class RSTToMarkdownConverter:
                 
                 # Add the header with appropriate markdown syntax
                 result.append(f"{'#' * level} {lines[i]}")
+                headers += 1
                 i += 2  # Skip the underline
             else:
                 result.append(lines[i])
                 i += 1
-                
+        
+        self._count(headers)
         return '\n'.join(result)
     
     def _get_header_level(self, char):
@@ -111,7 +644,7 @@ class RSTToMarkdownConverter:
             admonition_content = match.group(2).strip()
             
             # Pre-process any raw HTML blocks within the admonition
-            raw_html_pattern = r'\.\.\s+raw::\s+html\s*\n\n(.*?)(?=\n\S|\n\n\n|\n\.\.|$)'
+            raw_html_pattern = r'\.\.\s+raw::\s+html\s*\n\n' + DIRECTIVE_BODY
             
             def process_raw_html(html_match):
                 html_content = html_match.group(1).strip()
@@ -129,7 +662,7 @@ class RSTToMarkdownConverter:
                     return html_content
             
             # Process any raw HTML in the content
-            admonition_content = re.sub(raw_html_pattern, process_raw_html, admonition_content, flags=re.DOTALL)
+            admonition_content = re.sub(raw_html_pattern, process_raw_html, admonition_content)
             
             # Format based on directive type
             if directive.lower() == 'note':
@@ -148,8 +681,8 @@ class RSTToMarkdownConverter:
                 return f"> **{directive.capitalize()}**\n> \n{self._format_blockquote_content(admonition_content)}"
         
         # Find and replace all admonition directives
-        pattern = r'\.\.\s+(note|warning|admonition|attention|caution|danger|error|hint|important|tip)::(.*?)(?=\n\S|\n\n\n|\n\.\.|$)'
-        content = re.sub(pattern, replace_admonition, content, flags=re.DOTALL)
+        pattern = r'\.\.\s+(note|warning|admonition|attention|caution|danger|error|hint|important|tip)::' + DIRECTIVE_BODY
+        content = self._sub('admonitions', pattern, replace_admonition, content)
         
         return content
     
@@ -169,12 +702,14 @@ class RSTToMarkdownConverter:
     
     def convert_raw_html(self, content):
         """Handle raw HTML blocks in RST."""
+        # Index the document once so each match can look up its context
+        index = LineIndex(content)
+        
         def replace_raw_html(match):
             html_content = match.group(1).strip()
             
             # Get context to determine if this is in an admonition/blockquote
-            context_before = match.string[:match.start()].split('\n')[-5:]
-            in_admonition = any(line.startswith('   ') for line in context_before)
+            in_admonition = index.in_indented_context(match.start())
             
             # Check if this is a <pre> block that should be preserved as code
             if re.match(r'^\s*<pre>', html_content):
@@ -198,18 +733,73 @@ class RSTToMarkdownConverter:
                 return f"\n\n{html_content}\n\n"
         
         # Find and replace raw HTML directives
-        pattern = r'\.\.\s+raw::\s+html\s*\n\n(.*?)(?=\n\S|\n\n\n|\n\.\.|$)'
-        content = re.sub(pattern, replace_raw_html, content, flags=re.DOTALL)
+        pattern = r'\.\.\s+raw::\s+html\s*\n\n' + DIRECTIVE_BODY
+        content = self._sub('raw_html', pattern, replace_raw_html, content)
         
         # Remove any 'html' text that appears in blockquotes
-        content = re.sub(r'(>\s*)html\s*\n', r'\1\n', content)
+        content = self._sub('html_labels', r'(>\s*)html\s*\n', r'\1\n', content)
         
         return content
     
+    def convert_references(self, content):
+        """Rewrite :ref:, :doc: and `label`_ references as links to the converted documents.
+        
+        Literal blocks and the bodies of code directives are left as they
+        are, including inside admonitions that are already blockquotes.
+        """
+        if self.xref is None:
+            return content
+        document = getattr(self._local, 'document', None)
+        lines = content.split('\n')
+        result = []
+        # Lines of the current run of text, rewritten together so references can wrap
+        text = []
+        # Indentation of the line that opened the current literal block, if any, and of
+        # its first line. convert_admonitions strips the indentation of an admonition's
+        # first line, so a literal block ends where lines are less indented than it starts
+        literal_indent = None
+        body_indent = None
+        
+        for line in lines:
+            body = line[quote_prefix_pattern.match(line).end():]
+            stripped = body.lstrip()
+            indent = len(body) - len(stripped)
+            if literal_indent is not None:
+                if body_indent is None and indent > literal_indent:
+                    body_indent = indent
+                if not stripped or (body_indent is not None and indent >= body_indent):
+                    result.append(line)
+                    continue
+                literal_indent = None
+            if self.literal_marker_pattern.match(body) or self.code_directive_pattern.match(body):
+                literal_indent = indent
+                body_indent = None
+            if not text:
+                result.append(None)
+            text.append(line)
+            if literal_indent is not None:
+                result[-1] = self.xref.rewrite('\n'.join(text), document)
+                text = []
+        
+        if text:
+            result[-1] = self.xref.rewrite('\n'.join(text), document)
+        return '\n'.join(result)
+    
+    def _include_context(self):
+        """Return what converted includes depend on besides their own source.
+        
+        Reference links are written relative to the including document, so
+        with an index the include cache is kept per directory of includer.
+        """
+        document = getattr(self._local, 'document', None)
+        if self.xref is None or document is None:
+            return None
+        return os.path.dirname(os.path.abspath(document))
+    
     def convert_links(self, content):
         """Convert RST links to Markdown links."""
         # Convert RST link syntax: `text <url>`_ to Markdown: [text](url)
-        content = re.sub(r'`([^`]+)\s+<([^>]+)>`_', r'[\1](\2)', content)
+        content = self._sub('links', r'`([^`]+)\s+<([^>]+)>`_', r'[\1](\2)', content)
         
         return content
     
@@ -244,33 +834,44 @@ class RSTToMarkdownConverter:
             
             # If we have width or alignment, we need to use HTML
             if width or align or css_class:
-                align_style = f"text-align: {align};" if align else ""
-                width_style = f"width: {width};" if width else ""
-                style = f" style=\"{align_style}{width_style}\"" if align_style or width_style else ""
-                class_attr = f" class=\"{css_class}\"" if css_class else ""
-                
-                md_image = f"<img src=\"{image_path}\" alt=\"{alt_text}\"{style}{class_attr}>"
-                
-                # If centered, wrap in div
-                if align == "center":
-                    md_image = f"<div style=\"text-align: center;\">{md_image}</div>"
+                md_image = self._format_image_html(image_path, alt_text, width, align, css_class)
             
             return md_image
         
         # Find and replace image directives
-        pattern = r'\.\.\s+image::\s+(.*?)(?=\n\S|\n\n\n|\n\.\.|$)'
-        content = re.sub(pattern, replace_image, content, flags=re.DOTALL)
+        pattern = r'\.\.\s+image::\s+' + DIRECTIVE_BODY
+        content = self._sub('images', pattern, replace_image, content)
         
         return content
     
+    def _format_image_html(self, image_path, alt_text, width, align, css_class):
+        """Format an image with attributes as an HTML img tag."""
+        align_style = f"text-align: {align};" if align else ""
+        width_style = f"width: {width};" if width else ""
+        style = f" style=\"{align_style}{width_style}\"" if align_style or width_style else ""
+        class_attr = f" class=\"{css_class}\"" if css_class else ""
+        
+        html_image = f"<img src=\"{image_path}\" alt=\"{alt_text}\"{style}{class_attr}>"
+        
+        # If centered, wrap in div
+        if align == "center":
+            html_image = f"<div style=\"text-align: center;\">{html_image}</div>"
+        
+        return html_image
+    
     def convert_inline_image_attributes(self, content):
         """Convert inline image attributes that appear after an image."""
         # Find lines that look like image attributes after an image
         lines = content.split('\n')
         result = []
+        images = 0
         i = 0
+        next_check = 0
         
         while i < len(lines):
+            if i >= next_check:
+                self._check_budget()
+                next_check = i + BUDGET_CHECK_LINES
             line = lines[i]
             # Check if this line is an image in Markdown format, with or without blockquote prefix
             img_match = re.match(r'^(>\s*)?\!\[(.*?)\]\((.*?)\)\s*$', line)
@@ -307,34 +908,27 @@ class RSTToMarkdownConverter:
                         css_class = attr[7:].strip()
                 
                 # Create HTML image with attributes
-                align_style = f"text-align: {align};" if align else ""
-                width_style = f"width: {width};" if width else ""
-                style = f" style=\"{align_style}{width_style}\"" if align_style or width_style else ""
-                class_html = f" class=\"{css_class}\"" if css_class else ""
-                
-                html_image = f"<img src=\"{image_path}\" alt=\"{alt_text}\"{style}{class_html}>"
-                
-                # If centered, wrap in div
-                if align == "center":
-                    html_image = f"<div style=\"text-align: center;\">{html_image}</div>"
+                html_image = self._format_image_html(image_path, alt_text, width, align, css_class)
                 
                 # Add the converted image with the original prefix and skip the attribute lines
                 result.append(f"{prefix}{html_image}")
+                images += 1
                 i = j
             else:
                 # Just a regular line, add it as is
                 result.append(line)
                 i += 1
         
+        self._count(images)
         return '\n'.join(result)
     
     def convert_code_blocks(self, content):
         """Convert RST code blocks to Markdown code blocks."""
         # Convert code blocks with double colon
-        content = re.sub(r'::[ \t]*\n\n([ \t]+[^\n]+\n)+', self._format_code_block, content)
+        content = self._sub('literal_blocks', r'::[ \t]*\n\n([ \t]+[^\n]+\n)+', self._format_code_block, content)
         
         # Convert literal blocks
-        content = re.sub(r'\.\.\s+code::\s+([^\n]+)\n\n([ \t]+[^\n]+\n)+', self._format_code_block_with_language, content)
+        content = self._sub('code_directives', r'\.\.\s+code::\s+([^\n]+)\n\n([ \t]+[^\n]+\n)+', self._format_code_block_with_language, content)
         
         return content
     
@@ -360,49 +954,91 @@ class RSTToMarkdownConverter:
     def clean_up(self, content):
         """Clean up any remaining RST-specific syntax."""
         # Remove any remaining RST directives
-        content = re.sub(r'\.\.\s+[a-zA-Z0-9_-]+::', '', content)
+        content = self._sub('directives', r'\.\.\s+[a-zA-Z0-9_-]+::', '', content)
         
         # Remove any remaining RST comments
-        content = re.sub(r'\.\.\s+[^\n]*\n', '', content)
+        content = self._sub('comments', r'\.\.\s+[^\n]*\n', '', content)
         
         # Remove any remaining image attributes
-        content = re.sub(r'^\s*:[a-zA-Z]+:.*?$', '', content, flags=re.MULTILINE)
+        content = self._run_stage('image_attributes', self._remove_attribute_lines, content)
         
-        # Remove any 'html' text that appears before code blocks
-        content = re.sub(r'>\s*html\s*\n>\s*\n>\s*', '> \n> ', content)
+        # Apply the declarative fix-ups, such as dropping stray 'html' labels
+        content = self._run_stage('fixup_rules', self.apply_rules, content)
         
         # Fix code blocks
-        content = self._fix_code_blocks(content)
+        content = self._run_stage('_fix_code_blocks', self._fix_code_blocks, content)
         
         # Fix multiple consecutive blank lines
-        content = re.sub(r'\n{3,}', '\n\n', content)
+        content = self._sub('blank_lines', r'\n{3,}', '\n\n', content)
         
         return content
         
-    def _fix_code_blocks(self, content):
-        """Fix issues with code blocks."""
-        # First, handle the specific URL patterns we know about
-        # These are exact patterns that need special handling
+    def _remove_attribute_lines(self, content):
+        """Blank out leftover :option: lines, with any blank lines just before them.
         
-        # Pattern 1: First URL in ActBlue section
-        pattern1 = r'(>\s*Select "ActBlue Default".*?endpoint URL follow this format:\s*\n>\s*\n>\s*)```\s*\n>\s*(https?://\[your actionkit hostname\]/webhooks/actblue/payments/\?account=Default%20ActBlue&backfill=1)\s*\n>\s*```'
-        content = re.sub(pattern1, r'\1\2', content, flags=re.DOTALL)
-        
-        # Pattern 2: Second URL in ActBlue section
-        pattern2 = r'(>\s*If you would like to backfill.*?backfill URL would be:\s*\n>\s*\n>\s*)```\s*\n>\s*(https?://\[your actionkit hostname\]/webhooks/actblue/payments/\?account=\[account info used for endpoint URL\]&backfill=1)\s*\n>\s*```'
-        content = re.sub(pattern2, r'\1\2', content, flags=re.DOTALL)
+        A line scan that gives the same result as substituting
+        ^\\s*:[a-zA-Z]+:.*?$ (MULTILINE), whose \\s* could run across every
+        following blank line from each line start and went quadratic.
+        """
+        lines = content.split('\n')
+        result = []
+        removed = 0
+        # Index in result where the current run of blank lines started
+        blank_run = None
+        next_check = 0
         
-        # Remove any 'html' text that appears in blockquotes
-        content = re.sub(r'(>\s*)html\s*\n', r'\1\n', content)
+        for n, line in enumerate(lines):
+            if n >= next_check:
+                self._check_budget()
+                next_check = n + BUDGET_CHECK_LINES
+            stripped = line.lstrip()
+            if stripped.startswith(':') and self.attribute_pattern.match(stripped):
+                if blank_run is not None:
+                    del result[blank_run:]
+                result.append('')
+                blank_run = None
+                removed += 1
+            elif not stripped:
+                if blank_run is None:
+                    blank_run = len(result)
+                result.append(line)
+            else:
+                blank_run = None
+                result.append(line)
         
+        self._count(removed)
+        return '\n'.join(result)
+    
+    def apply_rules(self, content):
+        """Apply the fix-up rules, each to the blocks it is scoped to, in one pass per block."""
+        content, hits = self.rules.apply(content)
+        self._count(sum(hits.values()))
+        return content
+    
+    def _fix_code_blocks(self, content):
+        """Fix issues with code blocks."""
         # Fix broken code blocks in blockquotes
+        content = self._run_stage('blockquote_code_lines', self._fix_blockquote_code_lines, content)
+        
+        # Ensure all code blocks are closed
+        content = self._run_stage('close_code_blocks', self._close_code_blocks, content)
+        
+        return content
+    
+    def _fix_blockquote_code_lines(self, content):
+        """Unwrap URLs fenced inside blockquotes and strip pre tags inside code blocks."""
+        fixes = 0
         lines = content.split('\n')
         in_code_block = False
         in_blockquote = False
         result = []
         i = 0
+        next_check = 0
         
         while i < len(lines):
+            if i >= next_check:
+                self._check_budget()
+                next_check = i + BUDGET_CHECK_LINES
             line = lines[i]
             
             # Special case for URLs in code blocks within blockquotes
@@ -417,6 +1053,7 @@ class RSTToMarkdownConverter:
                         # Found a URL in code blocks - remove the code blocks
                         result.append(lines[i+1])  # Add just the URL line
                         i = j + 1  # Skip past the closing code block
+                        fixes += 1
                         continue
             
             # Track if we're in a blockquote
@@ -432,30 +1069,76 @@ class RSTToMarkdownConverter:
             # Fix pre tags in code blocks
             if in_code_block and '<pre>' in line:
                 line = line.replace('<pre>', '')
+                fixes += 1
             if in_code_block and '</pre>' in line:
                 line = line.replace('</pre>', '')
+                fixes += 1
             
             result.append(line)
             i += 1
         
-        # Ensure all code blocks are closed
-        content = '\n'.join(result)
-        
+        self._count(fixes)
+        return '\n'.join(result)
+    
+    def _close_code_blocks(self, content):
+        """Close a code block left open at the end of the document."""
         # Count backticks to see if we have unclosed code blocks
         backtick_count = content.count('```')
         if backtick_count % 2 == 1:
             content += '\n```'
+            self._count(1)
         
         return content
 
-if __name__ == "__main__":
-    # Check if a file was specified
-    if len(sys.argv) > 1:
-        rst_file = sys.argv[1]
-    else:
-        rst_file = 'integrations.rst'  # Default to integrations.rst
+# Converter used by section worker processes, built by the pool initializer
+_section_converter = None
+
+def _init_section_worker(xref=None):
+    """Build the lexer converter once for this worker process."""
+    global _section_converter
+    _section_converter = RSTToMarkdownConverter(engine='lexer', xref=xref)
+
+def _convert_section(job):
+    """Render the blocks of one group of sections, as lines of an already include-free document."""
+    lines, source_path = job
+    _section_converter._local.document = source_path
+    return _section_converter._convert_lines(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert an RST file to Markdown.')
+    parser.add_argument('rst_file', nargs='?', default='integrations.rst',
+                        help='RST file to convert (default: integrations.rst)')
+    parser.add_argument('-o', '--output', help='Markdown file to write (default: alongside the input)')
+    parser.add_argument('--engine', choices=ENGINES, default='regex',
+                        help='Conversion engine to use (default: regex)')
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS',
+                        help='Convert with the lexer engine if the regex engine takes longer than this')
+    parser.add_argument('--rules', metavar='FILE',
+                        help='JSON or YAML file of fix-up rules (default: fixup_rules.json)')
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        help='Convert top-level sections in N processes (lexer engine only)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print the time, matches and size change of each conversion stage')
+    parser.add_argument('--profile-json', metavar='FILE',
+                        help='Write the per-stage profile as JSON to FILE')
+    args = parser.parse_args(argv)
     
-    converter = RSTToMarkdownConverter()
-    md_file = converter.convert_file(rst_file)
+    if args.jobs and args.engine != 'lexer':
+        parser.error('--jobs needs --engine lexer')
+    rules = RuleSet.load(args.rules) if args.rules else None
+    converter = RSTToMarkdownConverter(engine=args.engine, time_budget=args.time_budget, rules=rules)
+    if args.profile or args.profile_json:
+        profiler = StageProfiler()
+        md_file = converter.convert_file(args.rst_file, args.output, profiler=profiler)
+        if args.profile:
+            print(profiler.format_table())
+        if args.profile_json:
+            with open(args.profile_json, 'w', encoding='utf-8') as f:
+                f.write(profiler.to_json())
+    else:
+        md_file = converter.convert_file(args.rst_file, args.output, workers=args.jobs)
     
-    print(f"Converted {rst_file} to {md_file}")
+    print(f"Converted {args.rst_file} to {md_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Cross-reference index for a corpus of RST documents.
+One scan per file collects its explicit targets, section anchors and title
+into a persistent JSON index. Converters use the index to rewrite :ref:,
+:doc: and `label`_ references to the converted .md files with dictionary
+lookups. Only files whose size or mtime changed are rescanned on update.
+"""
+
+import argparse
+import json
+import os
+import posixpath
+import re
+import sys
+from collections import Counter
+
+from rst_block_lexer import tokenize_blocks
+from rst_common import atomic_write_json, find_rst_files
+from rst_to_md_converter_updated import slugify
+
+# Bump when the shape of a file record changes, so old indexes are rebuilt
+INDEX_VERSION = 1
+
+# Name of the index file, kept in the output directory next to the manifest
+INDEX_NAME = '.rst2md-xref.json'
+
+target_pattern = re.compile(r'^\.\.\s+_(`[^`]+`|[^:]+):\s*(.*)$')
+title_link_pattern = re.compile(r'`([^`<]+?)\s*<[^>]+>`_+')
+
+# :ref:/:doc: roles, then `label`_ and `text <label_>`_ references
+reference_pattern = re.compile(
+    r':(ref|doc):`([^`<]*?)\s*(?:<([^`>]+)>)?`'
+    r'|`([^`<]+?)\s*(?:<([^`>]+_)>)?`_(?!_)'
+)
+
+
+def normalize_name(name):
+    """Normalize a target or reference name the way docutils does."""
+    return ' '.join(name.strip('`').split()).lower()
+
+
+def scan_document(lines):
+    """Return the title, section anchors and targets of one RST document.
+
+    Anchors use docsify's slugs, numbered -1, -2 and so on when a heading
+    repeats. An internal target points at the heading that follows it, or
+    at the enclosing section when other content comes first.
+    """
+    record = {'title': None, 'anchors': {}, 'labels': {}, 'urls': {}}
+    seen = Counter()
+    section = {'anchor': None, 'title': None}
+    pending = []
+
+    for block in tokenize_blocks(lines):
+        if block['type'] == 'comment':
+            match = target_pattern.match(block['lines'][0])
+            if match:
+                name = normalize_name(match.group(1))
+                # A URL may continue on indented lines
+                url = ''.join([match.group(2).strip()] + [line.strip() for line in block['lines'][1:]])
+                if url:
+                    record['urls'][name] = url
+                else:
+                    pending.append(name)
+            continue
+
+        if block['type'] == 'header':
+            title = title_link_pattern.sub(r'\1', block['title'])
+            slug = slugify(title)
+            anchor = f"{slug}-{seen[slug]}" if seen[slug] else slug
+            seen[slug] += 1
+            if record['title'] is None:
+                record['title'] = title
+            record['anchors'].setdefault(normalize_name(title), anchor)
+            section = {'anchor': anchor, 'title': title}
+
+        for name in pending:
+            record['labels'][name] = dict(section)
+        pending = []
+
+    for name in pending:
+        record['labels'][name] = dict(section)
+    for name, label in record['labels'].items():
+        record['anchors'][name] = label['anchor']
+    return record
+
+
+class XrefIndex:
+    """Targets, anchors and titles of every document under a root directory.
+
+    Documents are named by their path relative to the root without the .rst
+    extension, in POSIX form, which is also where their .md file ends up.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.files = {}
+        self.stats = Counter()
+        # Lookup tables rebuilt from self.files: label -> {doc: label record}, doc -> title
+        self._labels = {}
+        self._docs = {}
+
+    @classmethod
+    def load(cls, path, root):
+        """Load an index saved by save(), or return an empty one."""
+        index = cls(root)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if data.get('version') == INDEX_VERSION and data.get('root') == index.root:
+            for doc, record in data['files'].items():
+                index._add(doc, record)
+        return index
+
+    def save(self, path):
+        """Atomically write the index as JSON."""
+        atomic_write_json(path, {'version': INDEX_VERSION, 'root': self.root, 'files': self.files},
+                          indent=1, sort_keys=True)
+
+    def doc_for(self, rst_file):
+        """Return the document name for an RST file path."""
+        relative = os.path.relpath(os.path.abspath(rst_file), self.root)
+        return os.path.splitext(relative)[0].replace(os.sep, '/')
+
+    def _add(self, doc, record):
+        self.files[doc] = record
+        self._docs[doc] = record['title']
+        for name, label in record['labels'].items():
+            self._labels.setdefault(name, {})[doc] = label
+        for name, url in record['urls'].items():
+            self._labels.setdefault(name, {})[doc] = {'url': url}
+
+    def _remove(self, doc):
+        record = self.files.pop(doc, None)
+        if record is None:
+            return
+        self._docs.pop(doc, None)
+        for name in list(record['labels']) + list(record['urls']):
+            entries = self._labels.get(name, {})
+            entries.pop(doc, None)
+            if not entries:
+                self._labels.pop(name, None)
+
+    def update_file(self, rst_file):
+        """Rescan one file if its size or mtime changed. Returns True if it was rescanned."""
+        doc = self.doc_for(rst_file)
+        stat = os.stat(rst_file)
+        record = self.files.get(doc)
+        if record is not None and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime_ns:
+            return False
+        with open(rst_file, 'r', encoding='utf-8') as f:
+            record = scan_document(f)
+        record['size'] = stat.st_size
+        record['mtime'] = stat.st_mtime_ns
+        self._remove(doc)
+        self._add(doc, record)
+        return True
+
+    def remove_file(self, rst_file):
+        """Drop a deleted file from the index."""
+        self._remove(self.doc_for(rst_file))
+
+    def update(self):
+        """Bring the whole index up to date. Returns (rescanned, removed) counts."""
+        present = set()
+        rescanned = 0
+        for path in find_rst_files(self.root):
+            present.add(self.doc_for(path))
+            rescanned += self.update_file(path)
+        removed = [doc for doc in self.files if doc not in present]
+        for doc in removed:
+            self._remove(doc)
+        return rescanned, len(removed)
+
+    def _link(self, doc, anchor, current):
+        """Return the link from the current document to doc, with an optional anchor."""
+        if doc == current and anchor:
+            return f"#{anchor}"
+        base = posixpath.dirname(current) if current else ''
+        path = posixpath.relpath(doc + '.md', base or '.')
+        return f"{path}#{anchor}" if anchor else path
+
+    def _resolve_label(self, name, current, local_first):
+        """Return (link, title) for a label, or (None, None) if it is unknown."""
+        if local_first and current in self.files:
+            # Targets in the same document win, including the implicit ones of section titles
+            record = self.files[current]
+            if name in record['anchors']:
+                return self._link(current, record['anchors'][name], current), None
+            if name in record['urls']:
+                return record['urls'][name], None
+        entries = self._labels.get(name)
+        if not entries:
+            return None, None
+        doc = current if current in entries else min(entries)
+        label = entries[doc]
+        if 'url' in label:
+            return label['url'], None
+        return self._link(doc, label['anchor'], current), label['title']
+
+    def _resolve_doc(self, target, current):
+        """Return (link, title) for a :doc: target, or (None, None) if it is unknown."""
+        target = target.strip()
+        if target.endswith('.rst'):
+            target = target[:-4]
+        if target.startswith('/'):
+            doc = posixpath.normpath(target.lstrip('/'))
+        else:
+            doc = posixpath.normpath(posixpath.join(posixpath.dirname(current or ''), target))
+        if doc not in self._docs:
+            return None, None
+        return self._link(doc, None, current), self._docs[doc]
+
+    def _lookup(self, kind, name, current):
+        """Return [link, title] for one reference; kind is doc, ref or label (for `label`_)."""
+        if kind == 'doc':
+            link, title = self._resolve_doc(name, current)
+        else:
+            link, title = self._resolve_label(normalize_name(name), current, kind == 'label')
+        return [link, title]
+
+    def references(self, text, document=None):
+        """Return what each reference in text resolves to, keyed by kind:name.
+
+        Saved with a converted page, this lets references_changed() tell
+        whether an index update affects that page, so a page is only
+        converted again when one of its own references resolves differently.
+        """
+        current = self.doc_for(document) if document else None
+        resolved = {}
+        for match in reference_pattern.finditer(text):
+            role, role_text, role_target, ref_text, ref_target = match.groups()
+            if role:
+                kind, name = role, role_target or role_text
+            else:
+                kind, name = 'label', ref_target[:-1] if ref_target else ref_text
+            key = f"{kind}:{name}"
+            if key not in resolved:
+                resolved[key] = self._lookup(kind, name, current)
+        return resolved
+
+    def references_changed(self, resolved, document=None):
+        """Return True if any reference recorded by references() now resolves differently."""
+        current = self.doc_for(document) if document else None
+        for key, value in resolved.items():
+            kind, _, name = key.partition(':')
+            if self._lookup(kind, name, current) != value:
+                return True
+        return False
+
+    def resolve_role(self, role, text, target, document=None):
+        """Return (link text, link) for a :ref: or :doc: role, with link None if unresolved.
+
+        target is the part in angle brackets, or None when the role has only text.
+        """
+        current = self.doc_for(document) if document else None
+        link, title = self._lookup(role, target or text, current)
+        self.stats['resolved' if link else 'unresolved'] += 1
+        return (text if target else title or text), link
+
+    def rewrite(self, text, document=None):
+        """Rewrite the references in text as Markdown links.
+
+        document is the path of the RST file the text comes from; relative
+        :doc: targets and the links written are relative to it. References
+        that cannot be resolved are left unchanged and counted.
+        """
+        current = self.doc_for(document) if document else None
+
+        def replace(match):
+            role, role_text, role_target, ref_text, ref_target = match.groups()
+            if role:
+                text, link = self.resolve_role(role, role_text, role_target, document)
+            else:
+                link, title = self._lookup('label', ref_target[:-1] if ref_target else ref_text, current)
+                self.stats['resolved' if link else 'unresolved'] += 1
+                text = ref_text
+            return f"[{text}]({link})" if link else match.group(0)
+
+        return reference_pattern.sub(replace, text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or update the cross-reference index for an RST tree.')
+    parser.add_argument('input_dir', help='Directory containing the RST sources')
+    parser.add_argument('-o', '--output', help=f"Index file to write (default: {INDEX_NAME} in input_dir)")
+    args = parser.parse_args(argv)
+
+    path = args.output or os.path.join(args.input_dir, INDEX_NAME)
+    index = XrefIndex.load(path, args.input_dir)
+    rescanned, removed = index.update()
+    index.save(path)
+    labels = sum(len(record['labels']) + len(record['urls']) for record in index.files.values())
+    print(f"Indexed {len(index.files)} documents and {labels} targets "
+          f"({rescanned} rescanned, {removed} removed) in {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from rst_to_md_converter_updated import RSTToMarkdownConverter
+
+# Enough text that the lexer engine has written Markdown before it reaches the bad bytes
+GOOD_PART = ''.join(f"Section {n}\n==========\n\nParagraph {n} of the page.\n\n" for n in range(2000))
+
+
+def test_failed_streaming_conversion_keeps_previous_output(tmp_path):
+    rst_file = tmp_path / 'page.rst'
+    md_file = tmp_path / 'page.md'
+    rst_file.write_bytes(GOOD_PART.encode('utf-8') + b'Broken \xff byte\n')
+    md_file.write_text('previous output\n', encoding='utf-8')
+
+    with pytest.raises(UnicodeDecodeError):
+        RSTToMarkdownConverter(engine='lexer').convert_file(str(rst_file), str(md_file))
+
+    assert md_file.read_text(encoding='utf-8') == 'previous output\n'
+    assert sorted(os.listdir(tmp_path)) == ['page.md', 'page.rst']
+
+
+def test_streaming_conversion_replaces_output(tmp_path):
+    rst_file = tmp_path / 'page.rst'
+    md_file = tmp_path / 'page.md'
+    rst_file.write_text(GOOD_PART, encoding='utf-8')
+    md_file.write_text('previous output\n', encoding='utf-8')
+
+    converter = RSTToMarkdownConverter(engine='lexer')
+    converter.convert_file(str(rst_file), str(md_file))
+
+    assert md_file.read_text(encoding='utf-8') == converter.convert_content(GOOD_PART)
+    assert sorted(os.listdir(tmp_path)) == ['page.md', 'page.rst']
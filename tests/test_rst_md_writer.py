@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip('docutils')
+
+from rst_analyzer import SimpleRSTAnalyzer
+from rst_to_md_converter_updated import RSTToMarkdownConverter
+
+SOURCE = "Title\n=====\n\nSee :ref:`setup` and :doc:`guide`.\n"
+
+
+def analyze(content):
+    report = SimpleRSTAnalyzer().analyze_content(content)
+    report.pop('timings')
+    return report
+
+
+def test_writer_roles_do_not_leak_into_other_parses():
+    before = analyze(SOURCE)
+    markdown = RSTToMarkdownConverter(engine='docutils').convert_content(SOURCE)
+    assert 'See setup and guide.' in markdown
+    after = analyze(SOURCE)
+    assert after == before
+    assert 'problematic' in after['custom_elements']
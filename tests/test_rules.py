@@ -0,0 +1,22 @@
+import pytest
+
+from rst_rules import RuleSet, default_rules
+from rst_to_md_converter_updated import RSTToMarkdownConverter
+
+
+@pytest.mark.parametrize('content, expected', [
+    # Malformed raw directives leave an 'html' label after whatever > ends the line before
+    ('<br>\n.. raw:: html\n', '<br>\n \n'),
+    ('Text >\n.. raw:: html\n', 'Text >\n \n'),
+    # The label outside the quote, right after a note
+    ('.. note::\n\n.. raw:: html\n', '> **Note**\n> \n>\n \n'),
+])
+def test_html_label_is_dropped_across_blocks(content, expected):
+    assert RSTToMarkdownConverter().convert_content(content) == expected
+
+
+def test_document_rules_run_in_order_over_the_whole_text():
+    rules = RuleSet.load(default_rules().source)
+    text, hits = rules.apply('> \n>  html\n>    \n>     html\nafter\n')
+    assert text == '> \n> \n> \nafter\n'
+    assert hits == {'html_label_before_code': 1, 'html_label': 1}
@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from rst_benchmark import MAX_PATHOLOGICAL_EXPONENT, _best_time, pathological_document
+from rst_to_md_converter_updated import DIRECTIVE_BODY, RSTToMarkdownConverter
+
+# Sizes of the pathological inputs, far enough apart that quadratic time can't hide in noise
+SMALL = 20 * 1024
+LARGE = 160 * 1024
+
+# Unterminated nested directive: a note whose body runs to the end of the input
+NESTED = '.. note::\n\n   .. admonition:: inner\n\n' + '      nested body line\n\n' * (LARGE // 24)
+
+
+def assert_scales_linearly(func_for_size):
+    small, _ = _best_time(func_for_size(SMALL), 3)
+    large, _ = _best_time(func_for_size(LARGE), 3)
+    bound = small * (LARGE / SMALL) ** MAX_PATHOLOGICAL_EXPONENT
+    assert large <= bound + 0.01, f"{large:.3f}s at {LARGE} bytes, {small:.3f}s at {SMALL} bytes"
+
+
+def test_directive_body_matches_unterminated_nested_body_in_linear_time():
+    pattern = re.compile(r'\.\.\s+note::' + DIRECTIVE_BODY)
+
+    def match(size):
+        content = NESTED[:size]
+        return lambda: pattern.match(content)
+
+    assert_scales_linearly(match)
+    # The body runs to the end of the input
+    assert not NESTED[pattern.match(NESTED).end():].strip()
+
+
+def test_unterminated_nested_directive_converts_in_linear_time():
+    converter = RSTToMarkdownConverter()
+
+    def convert(size):
+        content = NESTED[:size]
+        return lambda: converter.convert_content(content)
+
+    assert_scales_linearly(convert)
+
+
+@pytest.mark.parametrize('case', ['indented_body', 'raw_in_quote', 'comments'])
+def test_regex_engine_scales_linearly(case):
+    converter = RSTToMarkdownConverter()
+
+    def convert(size):
+        content = pathological_document(case, size)
+        return lambda: converter.convert_content(content)
+
+    assert_scales_linearly(convert)
+
+
+def test_time_budget_falls_back_to_lexer(capsys):
+    with open('integrations.rst', 'r', encoding='utf-8') as f:
+        content = f.read()
+    converter = RSTToMarkdownConverter(time_budget=1e-9)
+    markdown = converter.convert_content(content, source_path='integrations.rst')
+    assert converter.fallbacks == ['integrations.rst']
+    assert markdown == RSTToMarkdownConverter(engine='lexer').convert_content(content, source_path='integrations.rst')
+    assert markdown != RSTToMarkdownConverter().convert_content(content, source_path='integrations.rst')
+    assert 'exceeded its' in capsys.readouterr().err
+
+
+def test_time_budget_is_not_hit_by_ordinary_documents():
+    converter = RSTToMarkdownConverter(time_budget=60)
+    converter.convert_content(pathological_document('indented_body', SMALL))
+    assert converter.fallbacks == []
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+import watch_convert
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    try:
+        watcher = watch_convert.InotifyWatcher(str(tmp_path))
+    except (OSError, AttributeError) as e:
+        pytest.skip(f"inotify unavailable: {e}")
+    yield watcher
+    watcher.close()
+
+
+def vanish_before_watching(watcher, name):
+    """Make the watcher's directory named name disappear just before it is watched."""
+    add_watch = watcher._add_watch
+
+    def racing_add_watch(path):
+        if os.path.basename(path) == name:
+            os.rmdir(path)
+        add_watch(path)
+
+    watcher._add_watch = racing_add_watch
+
+
+def test_new_directory_removed_while_walking_is_skipped(tmp_path, watcher):
+    vanish_before_watching(watcher, 'gone')
+    (tmp_path / 'new' / 'gone').mkdir(parents=True)
+    (tmp_path / 'new' / 'page.rst').write_text('Page\n====\n', encoding='utf-8')
+
+    changed = watcher.wait(1.0)
+
+    assert str(tmp_path / 'new' / 'page.rst') in changed
+    assert not (tmp_path / 'new' / 'gone').exists()
+
+
+def test_overflow_rescan_skips_removed_directories(tmp_path, watcher, monkeypatch):
+    (tmp_path / 'gone').mkdir()
+    vanish_before_watching(watcher, 'gone')
+    # A real event wakes the watcher, which then reads a queue overflow as the kernel reports it
+    events = [watch_convert._event_header.pack(-1, watch_convert.IN_Q_OVERFLOW, 0, 0)]
+
+    def read(fd, size):
+        if not events:
+            raise BlockingIOError
+        return events.pop()
+
+    monkeypatch.setattr(watch_convert.os, 'read', read)
+    (tmp_path / 'page.rst').write_text('Page\n====\n', encoding='utf-8')
+
+    watcher.wait(1.0)
+
+    assert watcher.overflowed
+    assert not (tmp_path / 'gone').exists()
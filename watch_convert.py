@@ -0,0 +1,321 @@
+"""
+Watch mode for batch conversion.
+Monitors an RST source tree with inotify (or by polling where inotify is not
+available), coalesces bursts of saves, and re-converts only the files that
+changed. Used by `batch_convert.py --watch`.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+import batch_convert
+from docsify_index import DEFAULT_SIDEBAR_DEPTH, write_site
+from rst_assets import AssetStore
+from rst_common import find_rst_files
+
+# inotify event flags, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_event_header = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """Report changed paths under a directory tree using Linux inotify.
+
+    If the kernel's event queue overflows, the events lost with it can't be
+    recovered, so overflowed is set for the caller to rescan the tree.
+    """
+
+    def __init__(self, root):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.root = root
+        self.overflowed = False
+        self._dirs = {}
+        self._watch_tree(root)
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self._dirs[wd] = path
+
+    def _watch_tree(self, path):
+        """Watch path and every directory below it, and return the files found in them.
+
+        A directory removed between being listed and being watched, as
+        happens during a burst of deletes, is skipped along with what was
+        under it.
+        """
+        found = []
+        for dirpath, dirs, files in os.walk(path):
+            try:
+                self._add_watch(dirpath)
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                    raise
+                dirs[:] = []
+                continue
+            found.extend(os.path.join(dirpath, name) for name in files)
+        return found
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds and return the set of changed file paths."""
+        changed = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        while ready:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _event_header.unpack_from(data, offset)
+                offset += _event_header.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # Directories created while events were lost are not watched yet;
+                    # watching one again is harmless
+                    self.overflowed = True
+                    self._watch_tree(self.root)
+                    continue
+                if wd not in self._dirs or not name:
+                    continue
+                path = os.path.join(self._dirs[wd], name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Watch new directories and pick up files already inside them
+                        changed.update(self._watch_tree(path))
+                else:
+                    changed.add(path)
+            ready, _, _ = select.select([self._fd], [], [], 0)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Report changed paths by comparing size and mtime snapshots kept in memory."""
+
+    # Snapshots never miss a change, so there is nothing to rescan
+    overflowed = False
+
+    def __init__(self, root, interval=0.1):
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for dirpath, dirs, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        """Sleep for the polling interval (at most timeout) and return changed paths."""
+        time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+        snapshot = self._scan()
+        changed = {path for path, state in snapshot.items() if self._snapshot.get(path) != state}
+        changed.update(path for path in self._snapshot if path not in snapshot)
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, polling=False):
+    """Return an inotify watcher, or a polling watcher if inotify is unavailable."""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), falling back to polling", file=sys.stderr)
+    return PollingWatcher(root)
+
+
+def dependents(manifest, input_dir, changed, index=None):
+    """Return the RST files whose pages depend on a changed file or on the xref index.
+
+    A page depends on every file it includes, as recorded in its manifest
+    entry, and, with an index, on what its references resolve to.
+    """
+    changed = {os.path.abspath(path) for path in changed}
+    rst_files = set()
+    for key, entry in manifest.items():
+        rst_file = os.path.join(input_dir, os.path.splitext(key)[0] + '.rst')
+        if any(path in changed for path in entry.get('includes', {})):
+            rst_files.add(rst_file)
+        elif index is not None and index.references_changed(entry.get('references', {}), rst_file):
+            rst_files.add(rst_file)
+    return rst_files
+
+
+def stale_sources(manifest, input_dir, output_dir):
+    """Return the RST files whose manifest entries no longer match the tree.
+
+    That is every source that is new, whose size or mtime changed or one of
+    whose includes changed, and every source in the manifest that is gone.
+    Used to catch up after events were lost.
+    """
+    rst_files = set()
+    present = set()
+    for rst_file in find_rst_files(input_dir):
+        key = os.path.relpath(batch_convert.output_path_for(rst_file, input_dir, output_dir), output_dir)
+        present.add(key)
+        entry = manifest.get(key)
+        try:
+            stat = os.stat(rst_file)
+        except OSError:
+            continue
+        if not entry or entry.get('size') != stat.st_size or entry.get('mtime') != stat.st_mtime_ns:
+            rst_files.add(rst_file)
+            continue
+        for path, mtime in entry.get('includes', {}).items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    rst_files.add(rst_file)
+                    break
+            except OSError:
+                rst_files.add(rst_file)
+                break
+    for key in manifest:
+        if key not in present:
+            rst_files.add(os.path.join(input_dir, os.path.splitext(key)[0] + '.rst'))
+    return rst_files
+
+
+def watch_directory(input_dir, output_dir, engine='regex', debounce=0.05, polling=False,
+                    max_batches=None, xref=False, time_budget=None, rules_path=None, site=False,
+                    sidebar_depth=DEFAULT_SIDEBAR_DEPTH, assets=False):
+    """Keep output_dir in sync with input_dir until interrupted.
+
+    Changes are collected until no new event has arrived for debounce
+    seconds, then each changed RST file is converted once, along with the
+    pages that include a changed file. max_batches stops the loop after that
+    many bursts, which is mainly useful for scripting. With xref, the
+    cross-reference index is updated for the changed files before they are
+    converted, and pages whose references now resolve differently are
+    converted too. If inotify drops events because its queue overflowed,
+    every source is checked against the manifest instead. time_budget,
+    rules_path, site, sidebar_depth and assets work as in batch_convert;
+    the sidebar, search index and image digest cache are rewritten after
+    each burst.
+    """
+    watcher = make_watcher(input_dir, polling)
+    xref_path = None
+    if xref:
+        from rst_xref import INDEX_NAME
+        xref_path = os.path.join(output_dir, INDEX_NAME)
+    digests = AssetStore.load(output_dir).digests if assets else None
+    batch_convert.init_worker(engine, xref_path, input_dir, time_budget, rules_path, site,
+                              output_dir if assets else None, digests)
+    converter = batch_convert.worker_converter()
+    index = converter.xref
+    manifest = batch_convert.load_manifest(output_dir)
+    output_root = os.path.join(os.path.abspath(output_dir), '')
+    # A burst of events is never held back longer than this
+    max_delay = debounce * 10
+
+    pending = {}
+    last_event = None
+    batches = 0
+    print(f"Watching {input_dir} ({type(watcher).__name__})")
+    try:
+        while max_batches is None or batches < max_batches:
+            changed = watcher.wait(debounce if pending else 1.0)
+            now = time.perf_counter()
+            if watcher.overflowed:
+                watcher.overflowed = False
+                stale = stale_sources(manifest, input_dir, output_dir)
+                print(f"Events were lost (inotify queue overflow), rescanned {input_dir}: "
+                      f"{len(stale)} files out of date", file=sys.stderr)
+                changed = set(changed) | stale
+            for path in changed:
+                # Any file may be included by a page, so every change is collected,
+                # apart from what this loop writes when the output is inside the input tree
+                if os.path.abspath(path).startswith(output_root):
+                    continue
+                pending.setdefault(path, now)
+                last_event = now
+
+            if not pending:
+                continue
+            oldest = min(pending.values())
+            if now - last_event < debounce and now - oldest < max_delay:
+                continue
+
+            rst_files = {path for path in pending if path.endswith('.rst')}
+            if index is not None:
+                for rst_file in rst_files:
+                    if os.path.exists(rst_file):
+                        index.update_file(rst_file)
+                    else:
+                        index.remove_file(rst_file)
+                index.save(xref_path)
+            rst_files.update(path for path in dependents(manifest, input_dir, pending, index)
+                             if os.path.exists(path))
+            if not rst_files:
+                pending.clear()
+                continue
+
+            for rst_file in sorted(rst_files):
+                md_file = batch_convert.output_path_for(rst_file, input_dir, output_dir)
+                key = os.path.relpath(md_file, output_dir)
+                if not os.path.exists(rst_file):
+                    manifest.pop(key, None)
+                    if os.path.exists(md_file):
+                        os.unlink(md_file)
+                    print(f"Removed {md_file}")
+                    continue
+                result = batch_convert.convert_one((rst_file, md_file, manifest.get(key), False))
+                if result['status'] == 'failed':
+                    print(f"Error converting {rst_file}: {result['error']}", file=sys.stderr)
+                    continue
+                manifest[key] = result['manifest_entry']
+                if rst_file in pending:
+                    # Measured from the source file's modification time, so it covers detection too
+                    latency_ms = (time.time_ns() - result['manifest_entry']['mtime']) / 1e6
+                    reason = f"{latency_ms:.1f} ms after save"
+                else:
+                    reason = 'dependency changed'
+                print(f"{result['status'].capitalize()} {rst_file} -> {md_file} "
+                      f"in {result['seconds'] * 1000:.1f} ms ({reason})")
+            batch_convert.save_manifest(output_dir, manifest)
+            if assets:
+                converter.assets.save()
+            if site:
+                pages = batch_convert.site_pages(
+                    output_dir, [(os.path.join(output_dir, key), entry) for key, entry in manifest.items()])
+                write_site(output_dir, pages, sidebar_depth)
+            pending.clear()
+            batches += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()